@@ -2,12 +2,134 @@
 import threading
 import time
 import requests
-import json
 import pprint
+import queue
+import asyncio
+import concurrent.futures
+import random
+import socket
+import urllib.parse
+import array
+import math
+import multiprocessing
+import os
+import sys
+import importlib
+import collections
+import hashlib
+import json
+import re
+import traceback
 
 from pcaspy import Driver, SimpleServer, Alarm, Severity
+from pcaspy.driver import manager, Data
+from bpl_parser import parseInstanceMetrics, parseNamedItems
+from requests.adapters import HTTPAdapter
 from requests.exceptions import Timeout
+from requests.exceptions import ConnectTimeout
 from requests.exceptions import ConnectionError
+from requests.exceptions import RequestException
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default values of optional settings, which can be overridden in customized_config.py
+POLLING_MODE = 'thread'  # 'thread': three polling threads per appliance, 'asyncio': one event loop for all appliances
+ASYNC_CONCURRENCY = 10  # maximum number of requests in flight in asyncio polling mode
+HTTP_POOL_SIZE = 4  # maximum number of connections kept open to each appliance url
+HTTP_KEEP_ALIVE = True  # reuse connections between requests
+HTTP_GZIP = True  # ask appliances for gzip compressed responses
+CONNECT_TIMEOUT = None  # seconds to wait for a connection, REQUEST_TIMEOUT is used if None
+READ_TIMEOUT = None  # seconds to wait for a response, REQUEST_TIMEOUT is used if None
+INSTANCE_METRICS_INTERVAL = None  # seconds between polls of instance metrics, REQUEST_INTERVAL is used if None
+APPLIANCE_METRICS_INTERVAL = None  # seconds between polls of appliance metrics, REQUEST_INTERVAL is used if None
+STORAGE_METRICS_INTERVAL = None  # seconds between polls of storage metrics, REQUEST_INTERVAL is used if None
+POLL_JITTER = 0.1  # fraction of the interval by which every poll is randomly delayed or advanced
+BACKOFF_MAX_INTERVAL = 300  # maximum seconds between polls of an appliance which times out or refuses connections
+PROBE_TIMEOUT = 1  # seconds to wait for a connection when probing an appliance for recovery
+POLL_STATS_SIZE = 100  # number of latest polls of every endpoint kept for the latency percentile PVs
+CLUSTERS = []  # several clusters monitored from one host, each by its own worker process, see customized_config_example.py
+HEALTH_INTERVAL = 60  # seconds between the health summaries of all clusters printed by the supervisor
+HEALTH_REPORT_INTERVAL = 5  # seconds between the health reports of every worker to the supervisor
+WORKER_TIMEOUT = 60  # seconds without a health report after which a worker is restarted
+RESTART_DELAY = 5  # seconds before a worker which has failed is restarted
+CONFIG_CHECK_INTERVAL = 2  # seconds between checks whether customized_config.py has changed, None to never reload it
+REGISTER_BATCH_SIZE = 10  # appliances whose PVs are registered in one iteration of the main loop
+PRINT_PVS = False  # print the names of all PVs when they are registered
+RESPONSE_CACHE = True  # skip parsing and publishing of responses which have not changed since the last poll
+EXPORT_PORT = None  # port of the HTTP export of all PVs in Prometheus text format and JSON, None to not serve it
+EXPORT_ADDRESS = '127.0.0.1'  # address on which the HTTP export listens
+# Changes of these PVs smaller than or equal to the deadband are not published to clients
+# BPL reports these values with 2 decimals, so a deadband halfway between steps of 0.01 is not affected by float rounding
+PUBLISH_DEADBANDS = {
+    'dataRateGBPerDay': 0.015,
+    'sts_available_space': 0.015,
+    'sts_available_space_percent': 0.015,
+    'mts_available_space': 0.015,
+    'mts_available_space_percent': 0.015,
+    'lts_available_space': 0.015,
+    'lts_available_space_percent': 0.015,
+}
+# Metrics of an appliance which are published as PVs, one entry for each PV
+#   endpoint: BPL endpoint of the metric, 'instance', 'appliance' or 'storage'
+#   item: name of the item in appliance or storage metrics data, e.g. 'Paused PV count' or 'LTS'
+#   field: field of the instance metrics entry or of the item
+#   pv: PV name without prefix and identity
+#   convert: 'string', 'int', 'float' or 'number' (float with thousands separators)
+#   invalid: value of the PV when the metrics data is not available
+#   type, prec, unit: PV type, precision and units
+METRICS = [
+    { 'endpoint': 'instance',  'field': 'status',                  'pv': 'status',                      'convert': 'string', 'invalid': 'Disconnected', 'type': 'string' },
+    { 'endpoint': 'instance',  'field': 'MGMT_uptime',             'pv': 'MGMT_uptime',                 'convert': 'string', 'invalid': 'Unknown', 'type': 'string' },
+    { 'endpoint': 'instance',  'field': 'pvCount',                 'pv': 'pvCount',                     'convert': 'int',    'invalid': 0, 'type': 'int' },
+    { 'endpoint': 'instance',  'field': 'connectedPVCount',        'pv': 'connectedPVCount',            'convert': 'int',    'invalid': 0, 'type': 'int' },
+    { 'endpoint': 'instance',  'field': 'disconnectedPVCount',     'pv': 'disconnectedPVCount',         'convert': 'int',    'invalid': 0, 'type': 'int' },
+    { 'endpoint': 'appliance', 'item': 'Paused PV count', 'field': 'value', 'pv': 'pausedPVCount',      'convert': 'int',    'invalid': 0, 'type': 'int' },
+    { 'endpoint': 'instance',  'field': 'dataRateGBPerDay',        'pv': 'dataRateGBPerDay',            'convert': 'float',  'invalid': 0, 'type': 'float', 'prec': 2, 'unit': 'GB/day' },
+    { 'endpoint': 'storage',   'item': 'STS', 'field': 'total_space',             'pv': 'sts_total_space',             'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': 'GB' },
+    { 'endpoint': 'storage',   'item': 'STS', 'field': 'available_space',         'pv': 'sts_available_space',         'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': 'GB' },
+    { 'endpoint': 'storage',   'item': 'STS', 'field': 'available_space_percent', 'pv': 'sts_available_space_percent', 'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': '%' },
+    { 'endpoint': 'storage',   'item': 'MTS', 'field': 'total_space',             'pv': 'mts_total_space',             'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': 'GB' },
+    { 'endpoint': 'storage',   'item': 'MTS', 'field': 'available_space',         'pv': 'mts_available_space',         'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': 'GB' },
+    { 'endpoint': 'storage',   'item': 'MTS', 'field': 'available_space_percent', 'pv': 'mts_available_space_percent', 'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': '%' },
+    { 'endpoint': 'storage',   'item': 'LTS', 'field': 'total_space',             'pv': 'lts_total_space',             'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': 'GB' },
+    { 'endpoint': 'storage',   'item': 'LTS', 'field': 'available_space',         'pv': 'lts_available_space',         'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': 'GB' },
+    { 'endpoint': 'storage',   'item': 'LTS', 'field': 'available_space_percent', 'pv': 'lts_available_space_percent', 'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': '%' },
+]
+EXTRA_METRICS = []  # more metrics in the same format as METRICS, published in addition to METRICS
+# Aggregates of metrics over all appliances, published as PVs for cluster deployment
+#   pv: PV name without prefix
+#   metric: pv of the aggregated metric in METRICS
+#   function: 'sum', 'min' or 'max' of the valid values, or 'invalid' for the number of appliances whose metric is invalid
+#   type, prec, unit, low, high: PV type, precision, units and alarm limits
+# An aggregate other than 'invalid' has a minor COMM alarm if the metric of any appliance is invalid
+AGGREGATES = [
+    { 'pv': 'cluster:pvCount',                        'metric': 'pvCount',                     'function': 'sum', 'type': 'int' },
+    { 'pv': 'cluster:connectedPVCount',               'metric': 'connectedPVCount',            'function': 'sum', 'type': 'int' },
+    { 'pv': 'cluster:dataRateGBPerDay',               'metric': 'dataRateGBPerDay',            'function': 'sum', 'type': 'float', 'prec': 2, 'unit': 'GB/day' },
+    { 'pv': 'cluster:lts_min_available_space_percent', 'metric': 'lts_available_space_percent', 'function': 'min', 'type': 'float', 'prec': 2, 'unit': '%' },
+    { 'pv': 'cluster:disconnectedNodeCount',          'metric': 'status',                      'function': 'invalid', 'type': 'int', 'low': -1, 'high': 1 },
+]
+# Storage tiers whose fill rate and time until full are forecast, with the alarm limits of the hours until full
+# Each tier has the PVs <tier>_fill_rate in GB/hour and <tier>_hours_until_full, e.g. lts_fill_rate
+FORECAST_TIERS = {
+    'STS': { 'low': 6,   'lolo': 1 },
+    'MTS': { 'low': 72,  'lolo': 24 },
+    'LTS': { 'low': 720, 'lolo': 168 },
+}
+FORECAST_TIME_CONSTANT = 6  # hours after which the weight of a sample in the forecast has decayed to 1/e
+FORECAST_MAX_HOURS = 87600  # hours until full published when a tier is not filling up
+FORECAST_WARMUP = None  # hours of samples before the forecast is published, FORECAST_TIME_CONSTANT / 2 is used if None
+# Metrics of every appliance whose history is published as waveform PVs <pv>:history:<resolution>
+HISTORY_METRICS = ['dataRateGBPerDay', 'connectedPVCount', 'lts_available_space']
+HISTORY_INTERVAL = None  # seconds between raw samples of the history, INSTANCE_METRICS_INTERVAL is used if None
+# Resolutions of the history, each published with a waveform PV history:<name>:time of the sample times
+#   name: resolution in the PV names
+#   period: seconds of samples averaged into one point, 0 for every sample
+#   size: number of points kept
+HISTORY_RESOLUTIONS = [
+    { 'name': 'raw',   'period': 0,   'size': 360 },
+    { 'name': '1min',  'period': 60,  'size': 240 },
+    { 'name': '10min', 'period': 600, 'size': 144 },
+]
 
 # Try the Customized Configuration first, then the default Configuration
 try:
@@ -19,372 +141,1617 @@ except ImportError:
     REQUEST_INTERVAL = 5
     prefix = 'MTEST:'
 
-print('\n')
-print('*** This tool is used to monitor status of Archiver Appliance deployed as either single node or cluster ***')
-print('\n')
+# PVs with the statistics of the polls of every metrics endpoint, by name after the endpoint
+POLL_STATS_PVS = {
+    'latency':      { 'type': 'float', 'prec': 1, 'unit': 'ms', 'value': 0 },
+    'latency_p50':  { 'type': 'float', 'prec': 1, 'unit': 'ms', 'value': 0 },
+    'latency_p99':  { 'type': 'float', 'prec': 1, 'unit': 'ms', 'value': 0 },
+    'failures':     { 'type': 'int', 'value': 0 },
+    'last_success': { 'type': 'string', 'value': '' },
+    'bytes':        { 'type': 'int', 'unit': 'B', 'value': 0 },
+    'parse_time':   { 'type': 'float', 'prec': 2, 'unit': 'ms', 'value': 0 },
+    'period':       { 'type': 'float', 'prec': 1, 'unit': 's', 'value': 0 },
+    'cache_hits':   { 'type': 'int', 'value': 0 },
+    'cache_misses': { 'type': 'int', 'value': 0 },
+}
+
+# Converters of metrics data fields into PV values
+CONVERTERS = {
+    'string': str,
+    'int': int,
+    'float': float,
+    'number': lambda value: float(str(value).replace(',', '')),
+}
+
+# Result of a fetch whose response has not changed since the last poll, so its metrics are not parsed and published again
+UNCHANGED = object()
+
+# Array typecodes of the history of int and float metrics, int32 and float32
+HISTORY_TYPECODES = { 'int': 'i', 'float': 'f' }
+
+# PV name of an appliance without prefix
+# PVs for single node do not distinguish identifiers, whereas PVs for multiple nodes distinguish identifiers
+def pvName(appliance, name):
+    if number_of_nodes == 1:
+        return name
+    return f'{appliance["identity"]}:{name}'
 
-number_of_nodes = len(appliances)
+# Paths of the BPL endpoints of the metrics data, the appliance and storage metrics data are requested for one appliance
+BPL_PATHS = {
+    'instance': '/mgmt/bpl/getInstanceMetrics',
+    'appliance': '/mgmt/bpl/getApplianceMetricsForAppliance?appliance={identity}',
+    'storage': '/mgmt/bpl/getStorageMetricsForAppliance?appliance={identity}',
+}
 
-if number_of_nodes == 0:
-    print('Error: the length of appliances should not be 0, exiting ...')
-    exit()
+# Request urls of the metrics endpoints of an appliance, by endpoint
+def requestUrls(appliance):
+    return { endpoint: appliance['url'] + path.format(identity = appliance['identity']) for endpoint, path in BPL_PATHS.items() }
 
-if number_of_nodes == 1:
-    print('Configured to monitor single node of Archiver Appliance')
-    print(f'url: {appliances[0]["url"]}')
-    print(f'identity: {appliances[0]["identity"]}')
+# Bindings of an appliance which has been removed, whose late poll results are dropped
+EMPTY_BINDINGS = { 'instance': [], 'appliance': [], 'storage': [] }
+
+# Resolve the PV names and converters of all metrics of an appliance, by endpoint
+# Each binding is (PV name, item, field, converter, invalid value), item is None for instance metrics
+def bindMetrics(appliance):
+    bindings = { 'instance': [], 'appliance': [], 'storage': [] }
+    for metric in metrics:
+        bindings[metric['endpoint']].append((pvName(appliance, metric['pv']), metric.get('item'), metric['field'],
+                                             CONVERTERS[metric['convert']], metric['invalid']))
+    return bindings
+
+# PV fields of a metric or aggregate
+def pvInfo(metric):
+    info = { 'type': metric['type'], 'value': '' if metric['type'] == 'string' else 0 }
+    for key in ('prec', 'unit', 'low', 'high', 'lolo', 'hihi'):
+        if key in metric:
+            info[key] = metric[key]
+    return info
+
+# Name of the cluster in CLUSTERS monitored by a worker process of the supervisor
+cluster_name = None
+
+# Check the configuration, derive the settings of the driver from it and build the PVs, exits if it is not valid
+def configure():
+    global number_of_nodes, http_timeout, instance_metrics_interval, appliance_metrics_interval, storage_metrics_interval
+    global history_interval, forecast_warmup, metrics, aggregates, history_metrics, metric_items, pvdb
 
-if number_of_nodes >= 2:
-    print('Configured to monitor multiple nodes of Archiver Appliance cluster')
     print('\n')
-    print('All nodes in the cluster are as below')
-    for appliance in appliances:
-        pprint.pprint(appliance)
+    print('*** This tool is used to monitor status of Archiver Appliance deployed as either single node or cluster ***')
     print('\n')
 
-# Build PVs for Archiver Appliance status
-pvdb = {}
-
-for appliance in appliances:
-
-    # PVs for single node do not distinguish identifiers, whereas PVs for multiple nodes distinguish identifiers
-    pv_identity = '' if number_of_nodes == 1 else appliance['identity']
-    pv_separator = '' if number_of_nodes == 1 else ':'
-
-    # Each appliance has the following PVs
-    pvdb[f'{pv_identity}{pv_separator}status']                      = { 'type': 'string', 'value': '' }
-    pvdb[f'{pv_identity}{pv_separator}MGMT_uptime']                 = { 'type': 'string', 'value': '' }
-    pvdb[f'{pv_identity}{pv_separator}pvCount']                     = { 'type': 'int', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}connectedPVCount']            = { 'type': 'int', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}disconnectedPVCount']         = { 'type': 'int', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}pausedPVCount']               = { 'type': 'int', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}dataRateGBPerDay']            = { 'type': 'float', 'prec': 2, 'unit': 'GB/day', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}sts_total_space']             = { 'type': 'float', 'prec': 2, 'unit': 'GB', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}sts_available_space']         = { 'type': 'float', 'prec': 2, 'unit': 'GB', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}sts_available_space_percent'] = { 'type': 'float', 'prec': 2, 'unit': '%', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}mts_total_space']             = { 'type': 'float', 'prec': 2, 'unit': 'GB', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}mts_available_space']         = { 'type': 'float', 'prec': 2, 'unit': 'GB', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}mts_available_space_percent'] = { 'type': 'float', 'prec': 2, 'unit': '%', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}lts_total_space']             = { 'type': 'float', 'prec': 2, 'unit': 'GB', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}lts_available_space']         = { 'type': 'float', 'prec': 2, 'unit': 'GB', 'value': 0 }
-    pvdb[f'{pv_identity}{pv_separator}lts_available_space_percent'] = { 'type': 'float', 'prec': 2, 'unit': '%', 'value': 0 }
-
-print('\n')
-print('*** The following PVs will be generated ***')
-for key, value in pvdb.items():
-    print(f'{prefix}{key}')
-print('\n')
- 
+    number_of_nodes = len(appliances)
+
+    if number_of_nodes == 0:
+        print('Error: the length of appliances should not be 0, exiting ...')
+        exit()
+
+    # Timeouts of every request as (connect, read)
+    http_timeout = (CONNECT_TIMEOUT if CONNECT_TIMEOUT is not None else REQUEST_TIMEOUT,
+                    READ_TIMEOUT if READ_TIMEOUT is not None else REQUEST_TIMEOUT)
+
+    # Polling intervals of the metrics endpoints
+    instance_metrics_interval = INSTANCE_METRICS_INTERVAL if INSTANCE_METRICS_INTERVAL is not None else REQUEST_INTERVAL
+    appliance_metrics_interval = APPLIANCE_METRICS_INTERVAL if APPLIANCE_METRICS_INTERVAL is not None else REQUEST_INTERVAL
+    storage_metrics_interval = STORAGE_METRICS_INTERVAL if STORAGE_METRICS_INTERVAL is not None else REQUEST_INTERVAL
+    history_interval = HISTORY_INTERVAL if HISTORY_INTERVAL is not None else instance_metrics_interval
+    forecast_warmup = FORECAST_WARMUP if FORECAST_WARMUP is not None else FORECAST_TIME_CONSTANT / 2
+
+    if POLLING_MODE not in ('thread', 'asyncio'):
+        print(f'Error: POLLING_MODE should be either thread or asyncio, not {POLLING_MODE}, exiting ...')
+        exit()
+
+    if number_of_nodes == 1:
+        print('Configured to monitor single node of Archiver Appliance')
+        print(f'url: {appliances[0]["url"]}')
+        print(f'identity: {appliances[0]["identity"]}')
+
+    if number_of_nodes >= 2:
+        print('Configured to monitor multiple nodes of Archiver Appliance cluster')
+        print('\n')
+        print('All nodes in the cluster are as below')
+        for appliance in appliances:
+            pprint.pprint(appliance)
+        print('\n')
+
+    metrics = METRICS + EXTRA_METRICS
+
+    for metric in metrics:
+        if not(metric.get('endpoint') in ('instance', 'appliance', 'storage')):
+            print(f'Error: endpoint of metric {metric} should be instance, appliance or storage, exiting ...')
+            exit()
+        if metric['endpoint'] != 'instance' and not('item' in metric):
+            print(f'Error: metric {metric} of {metric["endpoint"]} metrics data has no item, exiting ...')
+            exit()
+        if not(metric.get('convert') in CONVERTERS):
+            print(f'Error: convert of metric {metric} should be one of {", ".join(CONVERTERS)}, exiting ...')
+            exit()
+
+    # Aggregates are only published for cluster deployment
+    aggregates = AGGREGATES if number_of_nodes >= 2 else []
+
+    for aggregate in aggregates:
+        if not(aggregate.get('metric') in [metric['pv'] for metric in metrics]):
+            print(f'Error: metric of aggregate {aggregate} is not in METRICS, exiting ...')
+            exit()
+        if not(aggregate.get('function') in ('sum', 'min', 'max', 'invalid')):
+            print(f'Error: function of aggregate {aggregate} should be sum, min, max or invalid, exiting ...')
+            exit()
+
+    history_metrics = [metric for metric in metrics if metric['pv'] in HISTORY_METRICS]
+
+    for name in HISTORY_METRICS:
+        if not(name in [metric['pv'] for metric in history_metrics]):
+            print(f'Error: history metric {name} is not in METRICS, exiting ...')
+            exit()
+    for metric in history_metrics:
+        if not(metric['type'] in HISTORY_TYPECODES):
+            print(f'Error: history metric {metric["pv"]} should be of type int or float, exiting ...')
+            exit()
+
+    # Items of appliance and storage metrics data which are published as PVs
+    metric_items = { 'appliance': [], 'storage': [] }
+    for metric in metrics:
+        if metric['endpoint'] != 'instance' and not(metric['item'] in metric_items[metric['endpoint']]):
+            metric_items[metric['endpoint']].append(metric['item'])
+    for tier in FORECAST_TIERS:
+        if not(tier in metric_items['storage']):
+            metric_items['storage'].append(tier)
+
+    # Build the PVs of the cluster for Archiver Appliance status, the PVs of the appliances are built when they are registered
+    pvdb = {}
+
+    for aggregate in aggregates:
+        pvdb[aggregate['pv']] = pvInfo(aggregate)
+
+    # Statistics of the polls of instance metrics, which are polled once for all appliances
+    for key, info in POLL_STATS_PVS.items():
+        pvdb[f'poll:instance:{key}'] = dict(info)
+
+    # Times of the points of the history of every resolution
+    for resolution in HISTORY_RESOLUTIONS:
+        pvdb[f'history:{resolution["name"]}:time'] = { 'type': 'float', 'count': resolution['size'], 'prec': 0, 'unit': 's' }
+
+    # Statistics of the poller and the main loop
+    pvdb['poller:requestInterval'] = { 'type': 'float', 'prec': 1, 'unit': 's', 'value': REQUEST_INTERVAL }
+    pvdb['poller:cyclePeriod'] = { 'type': 'float', 'prec': 1, 'unit': 's', 'value': 0 }
+    pvdb['poller:processTime'] = { 'type': 'float', 'prec': 2, 'unit': 'ms', 'value': 0 }
+    pvdb['poller:processTimeMax'] = { 'type': 'float', 'prec': 2, 'unit': 'ms', 'value': 0 }
+
+    print('\n')
+    print(f'*** {len(pvdb)} PVs of the cluster and {len(appliancePVs(appliances[0]))} PVs of each appliance will be generated ***')
+    if PRINT_PVS:
+        for key in pvdb:
+            print(f'{prefix}{key}')
+    print('\n')
+
+# Build the PVs of one appliance
+def appliancePVs(appliance):
+    pvs = {}
+
+    # Each appliance has a PV for every metric
+    for metric in metrics:
+        pvs[pvName(appliance, metric['pv'])] = pvInfo(metric)
+
+    # Statistics of the polls of the appliance and storage metrics endpoints
+    for key, info in POLL_STATS_PVS.items():
+        for endpoint in ('appliance', 'storage'):
+            pvs[pvName(appliance, f'poll:{endpoint}:{key}')] = dict(info)
+
+    # Forecast of every storage tier
+    # Alarm limits above the hours published when a tier is not filling up, so that only low and lolo alarms are raised
+    for tier, limits in FORECAST_TIERS.items():
+        pvs[pvName(appliance, f'{tier.lower()}_fill_rate')] = { 'type': 'float', 'prec': 3, 'unit': 'GB/h' }
+        pvs[pvName(appliance, f'{tier.lower()}_hours_until_full')] = { 'type': 'float', 'prec': 1, 'unit': 'h',
+                                                                       'high': FORECAST_MAX_HOURS + 1, 'hihi': FORECAST_MAX_HOURS + 1, **limits }
+
+    # History of metrics, as waveforms of the points for every resolution
+    for resolution in HISTORY_RESOLUTIONS:
+        for metric in history_metrics:
+            info = pvInfo(metric)
+            info['count'] = resolution['size']
+            del info['value']
+            pvs[pvName(appliance, f'{metric["pv"]}:history:{resolution["name"]}')] = info
+
+    return pvs
+
+# Check a list of appliances read from the configuration, returns the error or None if it is valid
+def checkAppliances(nodes):
+    if not isinstance(nodes, list) or len(nodes) == 0:
+        return 'appliances should be a list of at least one appliance'
+    for appliance in nodes:
+        if not isinstance(appliance, dict) or not isinstance(appliance.get('url'), str) or not isinstance(appliance.get('identity'), str):
+            return f'appliance {appliance} should have a url and an identity'
+    identities = [appliance['identity'] for appliance in nodes]
+    if len(set(identities)) != len(identities):
+        return 'the identities of the appliances should be unique'
+    return None
+
+# Aggregate of one metric over all appliances, updated incrementally when the metric of one appliance changes
+# Appliances whose metric is invalid are excluded from the aggregate
+class ClusterAggregate:
+    def __init__(self, function, size):
+        self.function = function
+        self.size = size
+        self.values = {}  # valid values by identity
+        self.total = 0  # sum of the valid values
+        self.extreme = None  # identity of the appliance with the minimum or maximum value
+
+    # Set the metric of one appliance
+    def update(self, identity, value, invalid):
+        old = self.values.pop(identity, None)
+        if not invalid:
+            self.values[identity] = value
+
+        if self.function == 'sum':
+            # Adjust the sum by the difference, and start over from 0 when no value is left to avoid rounding drift
+            self.total += (0 if invalid else value) - (0 if old is None else old)
+            if not self.values:
+                self.total = 0
+
+        if self.function in ('min', 'max'):
+            better = min if self.function == 'min' else max
+            if identity == self.extreme and (invalid or better(value, old) != value):
+                # The appliance with the extreme value got worse or invalid, so search for the new extreme
+                self.extreme = better(self.values, key = self.values.get) if self.values else None
+            elif not invalid and (self.extreme is None or better(value, self.values[self.extreme]) == value):
+                self.extreme = identity
+
+    # Add an appliance, whose metric is invalid until it is set
+    def add(self, identity):
+        self.size += 1
+
+    # Remove an appliance
+    def remove(self, identity):
+        self.update(identity, None, True)
+        self.size -= 1
+
+    # Value of the aggregate
+    def value(self):
+        if self.function == 'sum':
+            return self.total
+        if self.function == 'invalid':
+            return self.size - len(self.values)
+        return self.values[self.extreme] if self.extreme is not None else 0
+
+    # Whether the aggregate misses the metric of any appliance
+    def isInvalid(self):
+        return self.function != 'invalid' and len(self.values) < self.size
+
+# Fixed-size ring buffer of numbers stored in an array, the oldest value is overwritten when it is full
+class RingBuffer:
+    def __init__(self, capacity, typecode = 'd'):
+        self.data = array.array(typecode, [0]) * capacity
+        self.capacity = capacity
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        self.data[(self.start + self.count) % self.capacity] = value
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    # Values from the oldest to the newest
+    def values(self):
+        end = self.start + self.count
+        if end <= self.capacity:
+            return self.data[self.start:end].tolist()
+        return self.data[self.start:].tolist() + self.data[:end - self.capacity].tolist()
+
+# Statistics of the polls of one metrics endpoint, published as PVs whose names start with name
+class PollStats:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = RingBuffer(POLL_STATS_SIZE)
+        self.latency = 0.0  # ms
+        self.bytes = 0
+        self.parseTime = 0.0  # ms
+        self.failures = 0
+        self.lastSuccess = ''
+        self.lastPoll = None
+        self.period = 0.0  # s
+        self.lastSuccessTime = None  # s since the epoch
+        self.refused = False  # whether the last failed poll failed since no connection could be opened, refused or timed out
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.reasons = { key: f'{name}:{key}' for key in POLL_STATS_PVS }
+
+    # Record a response, received after seconds
+    def received(self, seconds, size):
+        self.latency = seconds * 1000
+        self.latencies.append(self.latency)
+        self.bytes = size
+
+    # Record the time spent parsing a response
+    def parsed(self, seconds):
+        self.parseTime = seconds * 1000
+
+    # Record whether a response has been found unchanged in the response cache
+    def cached(self, hit):
+        if hit:
+            self.cacheHits += 1
+        else:
+            self.cacheMisses += 1
+
+    # Record the end of a poll
+    def polled(self, success):
+        now = time.monotonic()
+        if self.lastPoll is not None:
+            self.period = now - self.lastPoll
+        self.lastPoll = now
+        if success:
+            self.failures = 0
+            self.lastSuccess = time.strftime('%Y-%m-%d %H:%M:%S')
+            self.lastSuccessTime = time.time()
+        else:
+            self.failures += 1
+
+    # PV names and values of the statistics
+    def values(self):
+        latencies = sorted(self.latencies.values()) or [0.0]
+        return [
+            (self.reasons['latency'], self.latency),
+            (self.reasons['latency_p50'], latencies[math.ceil(0.5 * len(latencies)) - 1]),
+            (self.reasons['latency_p99'], latencies[math.ceil(0.99 * len(latencies)) - 1]),
+            (self.reasons['failures'], self.failures),
+            (self.reasons['last_success'], self.lastSuccess),
+            (self.reasons['bytes'], self.bytes),
+            (self.reasons['parse_time'], self.parseTime),
+            (self.reasons['period'], self.period),
+            (self.reasons['cache_hits'], self.cacheHits),
+            (self.reasons['cache_misses'], self.cacheMisses),
+        ]
+
+# Last response of a metrics endpoint from one url, against which the next response is checked for changes
+# The ETag and Last-Modified headers of the response are sent back as conditional request headers, and the bodies of
+# responses of appliances which do not send them are compared by their hash
+class CachedResponse:
+    def __init__(self, response, context):
+        self.etag = response.headers.get('ETag')
+        self.lastModified = response.headers.get('Last-Modified')
+        self.fingerprint = hashlib.blake2b(response.content, digest_size = 16).digest()
+        self.context = context  # what the response has been parsed for, e.g. the identities of the appliances
+
+    # Headers of a conditional request, answered with 304 Not Modified if the response has not changed
+    def headers(self):
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.lastModified is not None:
+            headers['If-Modified-Since'] = self.lastModified
+        return headers
+
+    # Whether a response is the same as this one
+    def matches(self, response):
+        if response.status_code == 304:
+            return True
+        return response.status_code == 200 and hashlib.blake2b(response.content, digest_size = 16).digest() == self.fingerprint
+
+# History of metrics at one resolution, one ring buffer of points for every series and one of their times
+# Each series has a PV name, an array typecode and a value of invalid points; int points are rounded and float points are NaN if invalid
+class HistoryResolution:
+    def __init__(self, name, period, size):
+        self.name = name
+        self.period = period
+        self.times = RingBuffer(size)
+        self.timesReason = f'history:{name}:time'
+        self.buffers = {}
+        self.waveforms = {}  # waveform PV names by series
+        self.fills = {}
+        self.sums = {}
+        self.counts = {}
+        self.bucket = None
+
+    # Add a series, whose points before it has been added are invalid
+    def addSeries(self, reason, typecode, invalid):
+        buffer = RingBuffer(self.times.capacity, typecode)
+        self.fills[reason] = invalid if typecode == 'i' else math.nan
+        for i in range(len(self.times)):
+            buffer.append(self.fills[reason])
+        self.buffers[reason] = buffer
+        self.waveforms[reason] = f'{reason}:history:{self.name}'
+        self.sums[reason] = 0.0
+        self.counts[reason] = 0
+
+    def removeSeries(self, reason):
+        del self.buffers[reason]
+        del self.waveforms[reason]
+        del self.fills[reason]
+        del self.sums[reason]
+        del self.counts[reason]
+
+    # Add a sample of all series, values are None if invalid
+    # Returns True if a point has been appended, which happens for every sample or at the end of every period
+    def add(self, timestamp, values):
+        if not self.period:
+            self.append(timestamp, values)
+            return True
+
+        appended = False
+        bucket = timestamp - timestamp % self.period
+        if self.bucket is not None and bucket != self.bucket:
+            means = {}
+            for reason, count in self.counts.items():
+                means[reason] = self.sums[reason] / count if count else None
+                self.sums[reason] = 0.0
+                self.counts[reason] = 0
+            self.append(self.bucket, means)
+            appended = True
+        self.bucket = bucket
+        for reason, value in values.items():
+            if value is not None:
+                self.sums[reason] += value
+                self.counts[reason] += 1
+        return appended
+
+    def append(self, timestamp, values):
+        self.times.append(timestamp)
+        for reason, buffer in self.buffers.items():
+            value = values[reason]
+            if value is None:
+                value = self.fills[reason]
+            elif buffer.data.typecode == 'i':
+                value = round(value)
+            buffer.append(value)
+
+# Fill rate forecast of one storage tier by exponentially weighted linear regression of the available space over time
+# The weighted sums are decayed and updated in O(1) for every sample, so samples at irregular intervals are handled
+class FillForecast:
+    def __init__(self, timeConstant):
+        self.timeConstant = timeConstant
+        self.origin = None
+        self.first = None
+        self.span = 0.0  # hours from the first to the last sample
+        self.last = 0.0
+        self.weight = self.t = self.y = self.tt = self.ty = 0.0
+
+    # Add a sample of the available space in GB at a time in hours
+    def add(self, hours, available):
+        if self.origin is None:
+            self.origin = self.first = hours
+        self.span = hours - self.first
+        # Move the origin of time to the last sample now and then, so the sums stay small and precise
+        if hours - self.origin > 10 * self.timeConstant:
+            shift = self.last
+            self.tt = self.tt - 2 * shift * self.t + shift * shift * self.weight
+            self.ty = self.ty - shift * self.y
+            self.t = self.t - shift * self.weight
+            self.origin += shift
+            self.last = 0.0
+        t = hours - self.origin
+        decay = math.exp(-(t - self.last) / self.timeConstant)
+        self.last = t
+        self.weight = self.weight * decay + 1
+        self.t = self.t * decay + t
+        self.y = self.y * decay + available
+        self.tt = self.tt * decay + t * t
+        self.ty = self.ty * decay + t * available
+
+    # Fill rate in GB/hour, the negative slope of the available space
+    def fillRate(self):
+        variance = self.weight * self.tt - self.t * self.t
+        if variance <= 1e-12 * self.weight * self.weight:
+            return 0.0
+        return -(self.weight * self.ty - self.t * self.y) / variance
+
+    # Hours until the available space is used up at the fill rate, FORECAST_MAX_HOURS if it is not filling up
+    def hoursUntilFull(self, available):
+        rate = self.fillRate()
+        if rate <= 0:
+            return FORECAST_MAX_HOURS
+        return min(max(available, 0) / rate, FORECAST_MAX_HOURS)
+
+# Labels of a sample in Prometheus text format, labels which are None are left out
+def prometheusLabels(**labels):
+    pairs = []
+    for key, value in labels.items():
+        if value is not None:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+# Snapshot of the published values and alarm states of all PVs, served by the HTTP export in Prometheus text format and as JSON
+# The main loop updates the snapshot and counts its versions, and each format is rendered again by a request only when the
+# snapshot has a new version, so requests neither render unchanged data twice nor hold up the main loop while rendering
+class ExportSnapshot:
+    def __init__(self, pollStats):
+        self.pvs = {}  # (identity, name, value, alarm, severity) by PV name without prefix, value is None until published
+        self.pollStats = pollStats  # for the times of the last successful polls
+        self.version = 0
+        self.time = time.time()
+        self.lock = threading.Lock()
+        self.renderLock = threading.Lock()
+        self.rendered = {}  # (version, body) by format
+
+    # Add the PVs of an appliance, or of the cluster if identity is None, with their names without identity
+    def add(self, identity, names):
+        with self.lock:
+            for reason, name in names.items():
+                self.pvs[reason] = (identity, name, None, Alarm.NO_ALARM, Severity.NO_ALARM)
+            self.version += 1
+
+    def remove(self, reasons):
+        with self.lock:
+            for reason in reasons:
+                self.pvs.pop(reason, None)
+            self.version += 1
+
+    # Set the published values and alarm states of PVs, given as (PV name, value, alarm, severity)
+    def update(self, changes):
+        with self.lock:
+            for reason, value, alarm, severity in changes:
+                entry = self.pvs.get(reason)
+                if entry is not None:
+                    self.pvs[reason] = entry[:2] + (value, alarm, severity)
+            self.version += 1
+            self.time = time.time()
+
+    # Body of the export in a format, 'prometheus' or 'json'
+    def render(self, format):
+        with self.renderLock:
+            version, body = self.rendered.get(format, (None, None))
+            if version == self.version:
+                return body
+            with self.lock:
+                version = self.version
+                updated = self.time
+                pvs = [entry for entry in self.pvs.values() if entry[2] is not None and not isinstance(entry[2], list)]
+            # Times of the last successful poll of every endpoint, by which clients can tell how stale the values are
+            identities = set(entry[0] for entry in pvs)
+            successes = [(endpoint, identity, stats.lastSuccessTime) for (endpoint, identity), stats in list(self.pollStats.items())
+                         if identity in identities or identity is None]
+            render = self.renderPrometheus if format == 'prometheus' else self.renderJson
+            body = render(pvs, successes, updated).encode()
+            self.rendered[format] = (version, body)
+            return body
+
+    # Numeric PVs as gauges named after the PV names, and the alarm severity of every PV
+    def renderPrometheus(self, pvs, successes, updated):
+        byName = {}
+        for identity, name, value, alarm, severity in pvs:
+            byName.setdefault(name, []).append((identity, value))
+        lines = []
+        for name in sorted(byName):
+            if isinstance(byName[name][0][1], str):
+                continue
+            metric = 'archiver_status_' + re.sub('[^a-zA-Z0-9_]', '_', name)
+            lines.append(f'# TYPE {metric} gauge')
+            for identity, value in byName[name]:
+                lines.append(f'{metric}{prometheusLabels(identity = identity)} {value}')
+        lines.append('# HELP archiver_status_alarm_severity Alarm severity of a PV, 0 none, 1 minor, 2 major, 3 invalid')
+        lines.append('# TYPE archiver_status_alarm_severity gauge')
+        for identity, name, value, alarm, severity in sorted(pvs, key = lambda entry: (entry[1], entry[0] or '')):
+            lines.append(f'archiver_status_alarm_severity{prometheusLabels(identity = identity, pv = name)} {severity}')
+        lines.append('# TYPE archiver_status_last_success_timestamp_seconds gauge')
+        for endpoint, identity, lastSuccess in successes:
+            if lastSuccess is not None:
+                lines.append(f'archiver_status_last_success_timestamp_seconds{prometheusLabels(identity = identity, endpoint = endpoint)} {lastSuccess}')
+        lines.append('# TYPE archiver_status_snapshot_timestamp_seconds gauge')
+        lines.append(f'archiver_status_snapshot_timestamp_seconds {updated}')
+        return '\n'.join(lines) + '\n'
+
+    # All PVs with their alarm states, of the cluster and by appliance, with the times of the last successful polls
+    def renderJson(self, pvs, successes, updated):
+        cluster = { 'pvs': {}, 'last_success': {} }
+        nodes = {}
+        for identity, name, value, alarm, severity in pvs:
+            node = cluster if identity is None else nodes.setdefault(identity, { 'pvs': {}, 'last_success': {} })
+            node['pvs'][name] = { 'value': value, 'alarm': Alarm.nameOf(alarm), 'severity': Severity.nameOf(severity) }
+        for endpoint, identity, lastSuccess in successes:
+            node = cluster if identity is None else nodes.get(identity)
+            if node is not None:
+                node['last_success'][endpoint] = lastSuccess
+        return json.dumps({ 'prefix': prefix, 'time': updated, 'cluster': cluster, 'appliances': nodes })
+
+# Serve the export snapshot over HTTP, /metrics in Prometheus text format and /json as JSON, by a thread for every request
+def startExport(snapshot):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = urllib.parse.urlsplit(self.path).path
+            if path == '/metrics':
+                body, contentType = snapshot.render('prometheus'), 'text/plain; version=0.0.4; charset=utf-8'
+            elif path == '/json':
+                body, contentType = snapshot.render('json'), 'application/json'
+            else:
+                self.send_error(404, 'Use /metrics or /json')
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', contentType)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        server = ThreadingHTTPServer((EXPORT_ADDRESS, EXPORT_PORT), Handler)
+    except OSError as e:
+        print(f'Error: the export cannot listen on {EXPORT_ADDRESS}:{EXPORT_PORT}: {e}, exiting ...')
+        exit()
+    server.daemon_threads = True
+    thread = threading.Thread(target = server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    print(f'*** PVs are exported on http://{EXPORT_ADDRESS}:{EXPORT_PORT}/metrics and /json ***')
+
+# Polling schedule of one metrics endpoint
+# Polls are spread by random jitter, and the delay grows exponentially while the endpoint fails
+class PollSchedule:
+    def __init__(self, interval):
+        self.interval = interval
+        self.failures = 0
+
+    # Delay before the first poll, so that appliances do not poll the cluster at the same moment
+    def firstDelay(self):
+        return random.uniform(0, self.interval * POLL_JITTER)
+
+    # Delay before the next poll, given whether the last poll succeeded
+    def nextDelay(self, success):
+        if success:
+            self.failures = 0
+            delay = self.interval
+        else:
+            maximum = max(BACKOFF_MAX_INTERVAL, self.interval)
+            # The failures stop counting once the delay has reached the maximum, so the power cannot overflow
+            if 0 < self.interval * 2 ** (self.failures - 1) < maximum:
+                self.failures += 1
+            delay = min(self.interval * 2 ** (self.failures - 1), maximum)
+        return delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+# Check whether a connection to one of the urls can be opened, without sending a request
+def probe(urls):
+    for url in urls:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        try:
+            with socket.create_connection((parts.hostname, port), timeout = PROBE_TIMEOUT):
+                return True
+        except OSError:
+            continue
+    return False
+
 class myDriver(Driver):
     def __init__(self):
         Driver.__init__(self)
-        # Create three polling threads for each appliance
-        for appliance in appliances:
-            self.tid = threading.Thread(target = self.pollInstanceMetrics, args = (appliance,)) 
-            self.tid.daemon = True
-            self.tid.start()
-            self.tid = threading.Thread(target = self.pollApplianceMetrics, args = (appliance,)) 
-            self.tid.daemon = True
-            self.tid.start()
-            self.tid = threading.Thread(target = self.pollStorageMetrics, args = (appliance,)) 
+        # Index of the appliance whose url served the last instance metrics data
+        self.instanceMetricsSource = 0
+        # Results handed over from the asyncio poller to the main thread
+        self.results = queue.Queue()
+        # New values of PVs which are not published yet, and the last published values
+        self.staged = {}
+        self.stagedLock = threading.Lock()
+        self.published = {}
+        # Appliances whose PVs are registered and which are polled, replaced as a whole when an appliance is added or removed
+        self.appliances = []
+        # Appliances waiting to be registered by the main loop
+        self.pending = collections.deque(appliances)
+        # PVs of removed appliances, which are kept for the CA clients still connected to them
+        self.retired = set()
+        # Functions which stop the pollers of each appliance, by identity
+        self.pollers = {}
+        # Urls of all appliances, probed by the instance metrics poller after failures
+        self.instanceUrls = []
+        self.instancePolling = False
+        # PV names and converters of the metrics of each appliance
+        self.bindings = {}
+        # Request urls of the metrics endpoints of each appliance
+        self.requestUrls = {}
+        # Aggregates, and aggregates by the PV names of the appliance metrics they aggregate
+        self.aggregates = [(aggregate, ClusterAggregate(aggregate['function'], 0)) for aggregate in aggregates]
+        self.aggregateMembers = {}
+        # Statistics of the polls of every metrics endpoint, by endpoint and identity
+        self.pollStats = { ('instance', None): PollStats('poll:instance') }
+        # Last responses of every metrics endpoint by url, by endpoint and identity
+        self.responses = { ('instance', None): {} }
+        # Last storage metrics data of each appliance, for the forecasts while it has not changed
+        self.storageItems = {}
+        # CPU time spent in server.process by the main loop, which leaves out the time it waits for CA requests
+        self.processTimes = RingBuffer(POLL_STATS_SIZE)
+        self.processTimesStaged = time.monotonic()
+        self.stageParam('poller:requestInterval', REQUEST_INTERVAL)
+        # Fill rate forecasts of the storage tiers of every appliance, by identity
+        # Each forecast is (tier, forecast, PV name of the fill rate, PV name of the hours until full)
+        self.forecasts = {}
+        # History of the history metrics of every appliance, sampled from the published values
+        self.historyReasons = []
+        self.history = [HistoryResolution(resolution['name'], resolution['period'], resolution['size'])
+                        for resolution in HISTORY_RESOLUTIONS]
+        self.historySample = time.monotonic() + history_interval
+        # Monitor deadbands of numeric PVs
+        self.deadbands = {}
+        # One pooled HTTP session for each appliance url, shared by all metrics endpoints of the url
+        self.sessions = {}
+        # Snapshot of the published PVs for the HTTP export
+        self.export = None
+        if EXPORT_PORT is not None:
+            self.export = ExportSnapshot(self.pollStats)
+            self.export.add(None, { reason: reason for reason in pvdb })
+            startExport(self.export)
+        # Modification time of customized_config.py, which is reloaded when it changes
+        self.configChecked = time.monotonic()
+        self.configTime = self.configModified()
+
+        if POLLING_MODE == 'asyncio':
+            # Create one thread which runs the event loop for all appliances
+            # Blocking requests run in a worker pool of ASYNC_CONCURRENCY threads, which limits the number of requests in flight
+            self.loop = asyncio.new_event_loop()
+            self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers = ASYNC_CONCURRENCY))
+            self.tid = threading.Thread(target = self.loop.run_forever)
             self.tid.daemon = True
             self.tid.start()
 
-    # Set alarm and invalid value for instance metrics
-    def invalidateInstanceMetrics(self, appliance):
-        pv_identity = '' if number_of_nodes == 1 else appliance['identity']
-        pv_separator = '' if number_of_nodes == 1 else ':'
-        self.setParam(f'{pv_identity}{pv_separator}status', 'Disconnected')
-        self.setParam(f'{pv_identity}{pv_separator}MGMT_uptime', 'Unknown')
-        self.setParam(f'{pv_identity}{pv_separator}pvCount', 0)
-        self.setParam(f'{pv_identity}{pv_separator}connectedPVCount', 0)
-        self.setParam(f'{pv_identity}{pv_separator}disconnectedPVCount', 0)
-        self.setParam(f'{pv_identity}{pv_separator}dataRateGBPerDay', 0)
-        self.setParamStatus(f'{pv_identity}{pv_separator}status', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}MGMT_uptime', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}pvCount', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}connectedPVCount', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}disconnectedPVCount', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}dataRateGBPerDay', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.updatePVs()
-
-    # Set alarm and invalid value for appliance metrics
-    def invalidateApplianceMetrics(self, appliance):
-        pv_identity = '' if number_of_nodes == 1 else appliance['identity']
-        pv_separator = '' if number_of_nodes == 1 else ':'
-        self.setParam(f'{pv_identity}{pv_separator}pausedPVCount', 0)
-        self.setParamStatus(f'{pv_identity}{pv_separator}pausedPVCount', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.updatePVs()
-
-    # Set alarm and invalid value for storage metrics
-    def invalidateStorageMetrics(self, appliance):
-        pv_identity = '' if number_of_nodes == 1 else appliance['identity']
-        pv_separator = '' if number_of_nodes == 1 else ':'
-        self.setParam(f'{pv_identity}{pv_separator}sts_total_space', 0)
-        self.setParam(f'{pv_identity}{pv_separator}sts_available_space', 0)
-        self.setParam(f'{pv_identity}{pv_separator}sts_available_space_percent', 0)
-        self.setParam(f'{pv_identity}{pv_separator}mts_total_space', 0)
-        self.setParam(f'{pv_identity}{pv_separator}mts_available_space', 0)
-        self.setParam(f'{pv_identity}{pv_separator}mts_available_space_percent', 0)
-        self.setParam(f'{pv_identity}{pv_separator}lts_total_space', 0)
-        self.setParam(f'{pv_identity}{pv_separator}lts_available_space', 0)
-        self.setParam(f'{pv_identity}{pv_separator}lts_available_space_percent', 0)
-        self.setParamStatus(f'{pv_identity}{pv_separator}sts_total_space', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}sts_available_space', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}sts_available_space_percent', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}mts_total_space', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}mts_available_space', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}mts_available_space_percent', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}lts_total_space', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}lts_available_space', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.setParamStatus(f'{pv_identity}{pv_separator}lts_available_space_percent', Alarm.COMM_ALARM, Severity.MINOR_ALARM)
-        self.updatePVs()
-
-    # Polling thread for instance metrics
-    def pollInstanceMetrics(self, appliance):
-        url = appliance["url"]
-        identity = appliance["identity"]
-        GET_INSTANCE_METRICS_URL = f'{url}/mgmt/bpl/getInstanceMetrics'
+    # Start polling one endpoint, by a polling thread or by a task of the asyncio event loop
+    # Returns a function which stops polling
+    # A fetch which is running when polling is stopped is not interrupted, so in asyncio mode it keeps one worker of the pool
+    # busy until its request has been answered or has timed out
+    def startPoller(self, fetch, apply, interval, urls, stats, *args):
+        if POLLING_MODE == 'asyncio':
+            future = asyncio.run_coroutine_threadsafe(self.pollAsyncTask(fetch, apply, interval, urls, stats, *args), self.loop)
+            return future.cancel
 
-        while True:
-            try:
-                # Get instance metrics data
-                response = requests.get(GET_INSTANCE_METRICS_URL, timeout = REQUEST_TIMEOUT)
+        stop = threading.Event()
+        self.tid = threading.Thread(target = self.pollEndpoint, args = (fetch, apply, interval, urls, stats, stop) + args)
+        self.tid.daemon = True
+        self.tid.start()
+        return stop.set
 
-                if response.status_code < 200 or response.status_code >= 300:
-                    print('Appliance ' + identity + ': ' + 'Bad response status code ' + str(response.status_code) + ' for instance metrics data')
-                    self.invalidateInstanceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+    # Register the PVs of pending appliances and start polling them, a batch in every iteration of the main loop
+    # Instance metrics are polled once all appliances of the configuration are registered, then customized_config.py is watched
+    def registerAppliances(self):
+        for i in range(min(REGISTER_BATCH_SIZE, len(self.pending))):
+            self.addAppliance(self.pending.popleft())
 
-                text = response.text
-                dataList = json.loads(text)
-
-                found = False
-                for item in dataList:
-                    if 'instance' in item and item['instance'] == identity:
-                        data = item
-                        found = True
-                        break
-                
-                if not found:
-                    print(f'Appliance {identity}: Instance data is not found')
-                    self.invalidateInstanceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+        if self.pending:
+            return
+        if not self.instancePolling:
+            self.instancePolling = True
+            self.startPoller(self.fetchInstanceMetrics, self.applyInstanceMetrics, instance_metrics_interval, self.instanceUrls,
+                             self.pollStats[('instance', None)])
+            print(f'*** {len(self.appliances)} appliances are registered ***')
+        self.checkConfig()
 
-                if not('status' in data):
-                    print(f'Appliance {identity}: Instance metrics data does not include status')
-                    self.invalidateInstanceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+    # Register the PVs of an appliance and start polling it, called from the main thread
+    # The PVs of an appliance which has been removed before are revived, so the CA clients still connected to them get updates
+    def addAppliance(self, appliance):
+        identity = appliance['identity']
+        pvs = appliancePVs(appliance)
+        created = {}
+        for reason, info in pvs.items():
+            if reason in self.retired:
+                self.retired.discard(reason)
+                manager.pvf[prefix + reason] = manager.pvs[self.port][reason]
+            else:
+                created[reason] = info
+        SimpleServer.createPV(prefix, created)
+        for reason in created:
+            data = Data()
+            data.value = manager.pvs[self.port][reason].info.value
+            self.pvDB[reason] = data
+        pvdb.update(pvs)
+        if self.export is not None:
+            self.export.add(identity, { reason: reason if number_of_nodes == 1 else reason[len(identity) + 1:] for reason in pvs })
+        if PRINT_PVS:
+            for reason in pvs:
+                print(f'{prefix}{reason}')
 
-                if not('MGMT_uptime' in data):
-                    print(f'Appliance {identity}: Instance metrics data does not include MGMT_uptime')
-                    self.invalidateInstanceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+        self.bindings[identity] = bindMetrics(appliance)
+        self.requestUrls[identity] = requestUrls(appliance)
+        for name, deadband in PUBLISH_DEADBANDS.items():
+            self.deadbands[pvName(appliance, name)] = deadband
+        for endpoint in ('appliance', 'storage'):
+            self.pollStats[(endpoint, identity)] = PollStats(pvName(appliance, f'poll:{endpoint}'))
+            self.responses[(endpoint, identity)] = {}
+        self.forecasts[identity] = [(tier, FillForecast(FORECAST_TIME_CONSTANT), pvName(appliance, f'{tier.lower()}_fill_rate'),
+                                     pvName(appliance, f'{tier.lower()}_hours_until_full')) for tier in FORECAST_TIERS]
+        for metric in history_metrics:
+            reason = pvName(appliance, metric['pv'])
+            self.historyReasons.append(reason)
+            for resolution in self.history:
+                resolution.addSeries(reason, HISTORY_TYPECODES[metric['type']], metric['invalid'])
+        with self.stagedLock:
+            for aggregate, state in self.aggregates:
+                state.add(identity)
+                self.aggregateMembers.setdefault(pvName(appliance, aggregate['metric']), []).append((aggregate['pv'], state, identity))
+                self.staged[aggregate['pv']] = (state.value(), state.isInvalid())
+        if not(appliance['url'] in self.sessions):
+            self.sessions[appliance['url']] = self.createSession()
 
-                if not('pvCount' in data):
-                    print(f'Appliance {identity}: Instance metrics data does not include pvCount')
-                    self.invalidateInstanceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+        self.appliances = self.appliances + [appliance]
+        self.instanceUrls[:] = [node['url'] for node in self.appliances]
+        # Two pollers for each appliance, instance metrics of all appliances are polled together
+        urls = [appliance['url']]
+        self.pollers[identity] = [
+            self.startPoller(self.fetchApplianceMetrics, self.applyApplianceMetrics, appliance_metrics_interval, urls,
+                             self.pollStats[('appliance', identity)], appliance),
+            self.startPoller(self.fetchStorageMetrics, self.applyStorageMetrics, storage_metrics_interval, urls,
+                             self.pollStats[('storage', identity)], appliance),
+        ]
 
-                if not('connectedPVCount' in data):
-                    print(f'Appliance {identity}: Instance metrics data does not include connectedPVCount')
-                    self.invalidateInstanceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+    # Stop polling an appliance, retire its PVs and drop its state, called from the main thread
+    # Retired PVs are not found by new CA clients, and the clients still connected to them see an invalid alarm
+    # A poll of the appliance which is still in flight, or whose result is still queued, finds no state and is dropped
+    def removeAppliance(self, appliance):
+        identity = appliance['identity']
+        for stop in self.pollers.pop(identity):
+            stop()
+        self.appliances = [node for node in self.appliances if node['identity'] != identity]
+        self.instanceUrls[:] = [node['url'] for node in self.appliances]
+
+        with self.stagedLock:
+            for aggregate, state in self.aggregates:
+                self.aggregateMembers.pop(pvName(appliance, aggregate['metric']), None)
+                state.remove(identity)
+                self.staged[aggregate['pv']] = (state.value(), state.isInvalid())
+        for metric in history_metrics:
+            reason = pvName(appliance, metric['pv'])
+            self.historyReasons.remove(reason)
+            for resolution in self.history:
+                resolution.removeSeries(reason)
+        pvs = appliancePVs(appliance)
+        if self.export is not None:
+            self.export.remove(pvs)
+        for reason in pvs:
+            manager.pvf.pop(prefix + reason, None)
+            pvdb.pop(reason, None)
+            self.published.pop(reason, None)
+            self.retired.add(reason)
+            self.setParamStatus(reason, Alarm.COMM_ALARM, Severity.INVALID_ALARM)
+            self.updatePV(reason)
+        self.bindings.pop(identity, None)
+        self.requestUrls.pop(identity, None)
+        for name in PUBLISH_DEADBANDS:
+            self.deadbands.pop(pvName(appliance, name), None)
+        for endpoint in ('appliance', 'storage'):
+            self.pollStats.pop((endpoint, identity), None)
+            self.responses.pop((endpoint, identity), None)
+        self.forecasts.pop(identity, None)
+        self.storageItems.pop(identity, None)
+        if not(appliance['url'] in self.instanceUrls):
+            self.sessions.pop(appliance['url']).close()
+
+    # Modification time of customized_config.py, or None if it is not used or reloading is disabled
+    def configModified(self):
+        module = sys.modules.get('customized_config')
+        if module is None or CONFIG_CHECK_INTERVAL is None:
+            return None
+        try:
+            return os.stat(module.__file__).st_mtime
+        except OSError:
+            return None
+
+    # Reload customized_config.py if it has changed, and add or remove appliances to match its appliances
+    # Other settings are not reloaded, and changes between single node and cluster are refused since they rename all PVs
+    def checkConfig(self):
+        if self.configTime is None or time.monotonic() - self.configChecked < CONFIG_CHECK_INTERVAL:
+            return
+        self.configChecked = time.monotonic()
+        modified = self.configModified()
+        if modified is None or modified == self.configTime:
+            return
+        self.configTime = modified
+
+        print('*** customized_config.py has changed, reloading the appliances ***')
+        try:
+            module = importlib.reload(sys.modules['customized_config'])
+        except Exception as e:
+            print(f'Error: customized_config.py cannot be reloaded, the appliances are not changed: {e}')
+            return
+        nodes = getattr(module, 'appliances', None)
+        for cluster in getattr(module, 'CLUSTERS', []):
+            if cluster.get('name') == cluster_name:
+                nodes = cluster.get('appliances', nodes)
+
+        error = checkAppliances(nodes)
+        if error is not None:
+            print(f'Error: {error}, the appliances are not changed')
+            return
+        if (len(nodes) == 1) != (number_of_nodes == 1):
+            print('Error: changes between single node and cluster rename all PVs and need a restart, the appliances are not changed')
+            return
+
+        configured = { appliance['identity']: appliance for appliance in nodes }
+        for appliance in self.appliances:
+            if configured.get(appliance['identity']) != appliance:
+                print(f'Appliance {appliance["identity"]}: Removed')
+                self.removeAppliance(appliance)
+        self.pending = collections.deque(appliance for appliance in self.pending if configured.get(appliance['identity']) == appliance)
+        known = self.appliances + list(self.pending)
+        for appliance in nodes:
+            if not(appliance in known):
+                print(f'Appliance {appliance["identity"]}: Added')
+                self.pending.append(appliance)
+
+    # Create an HTTP session which keeps connections to one appliance url open
+    def createSession(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = HTTP_POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Accept-Encoding'] = 'gzip, deflate' if HTTP_GZIP else 'identity'
+        if not HTTP_KEEP_ALIVE:
+            session.headers['Connection'] = 'close'
+        return session
+
+    # Send a GET request to the request url of a BPL endpoint of an appliance url
+    def httpGet(self, url, requestUrl, headers = None):
+        session = self.sessions.get(url)
+        if session is None:
+            # The url has been removed while it was polled
+            raise ConnectionError(f'{url} is no longer monitored')
+        return session.get(requestUrl, headers = headers, timeout = http_timeout)
+
+    # Send a GET request to a BPL endpoint of an appliance url, conditional on the last response from the url in responses
+    # Returns None if the response has not changed, so the last response is kept, or else the response
+    # The last response is dropped until the new one is cached by cacheResponse, so it is not used after a failed poll
+    def conditionalGet(self, url, requestUrl, stats, responses, context = None):
+        cached = responses.pop(url, None)
+        if cached is not None and cached.context != context:
+            cached = None
+        start = time.perf_counter()
+        response = self.httpGet(url, requestUrl, cached.headers() if cached is not None else None)
+        stats.received(time.perf_counter() - start, len(response.content))
+        if not RESPONSE_CACHE:
+            return response
+        unchanged = cached is not None and cached.matches(response)
+        stats.cached(unchanged)
+        if unchanged:
+            responses[url] = cached
+            return None
+        return response
+
+    # Cache a response which has been parsed, for conditionalGet
+    def cacheResponse(self, url, response, responses, context = None):
+        if RESPONSE_CACHE:
+            responses[url] = CachedResponse(response, context)
 
-                if not('disconnectedPVCount' in data):
-                    print(f'Appliance {identity}: Instance metrics data does not include disconnectedPVCount')
-                    self.invalidateInstanceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
+    # Set alarm and invalid value for the metrics of one endpoint of an appliance
+    def invalidateMetrics(self, appliance, endpoint):
+        for reason, item, field, convert, invalidValue in self.bindings.get(appliance['identity'], EMPTY_BINDINGS)[endpoint]:
+            self.stageParam(reason, invalidValue, invalid = True)
+
+    # Set the metrics of one endpoint of an appliance from the items of its metrics data
+    # items maps the item names to the items, or None to the instance metrics entry of the appliance
+    def updateMetrics(self, appliance, endpoint, items):
+        identity = appliance['identity']
+        values = []
+        for reason, item, field, convert, invalidValue in self.bindings.get(identity, EMPTY_BINDINGS)[endpoint]:
+            data = items.get(item)
+            if data is None or not(field in data):
+                name = field if item is None else f'{item} {field}'
+                print(f'Appliance {identity}: {endpoint.capitalize()} metrics data does not include {name}')
+                self.invalidateMetrics(appliance, endpoint)
+                return
+            try:
+                values.append((reason, convert(data[field])))
+            except (TypeError, ValueError):
+                name = field if item is None else f'{item} {field}'
+                print(f'Appliance {identity}: {endpoint.capitalize()} metrics data has invalid {name}: {data[field]}')
+                self.invalidateMetrics(appliance, endpoint)
+                return
+
+        for reason, value in values:
+            self.stageParam(reason, value)
+
+    # Get instance metrics data of all appliances from one of the configured urls
+    # Returns the identities of the appliances the data has been fetched for and the data, or None if it is not available
+    def fetchInstanceMetrics(self):
+        nodes = self.appliances
+        identities = [appliance['identity'] for appliance in nodes]
+        stats = self.pollStats[('instance', None)]
+        responses = self.responses[('instance', None)]
+        refusals = 0
+        # Start from the url which answered last time, then fail over to the other urls
+        for offset in range(len(nodes)):
+            index = (self.instanceMetricsSource + offset) % len(nodes)
+            url = nodes[index]['url']
+            identity = nodes[index]['identity']
+            urls = self.requestUrls.get(identity)
+            if urls is None:
+                # The appliance has been removed
+                continue
+
+            try:
+                response = self.conditionalGet(url, urls['instance'], stats, responses, identities)
+
+                if response is None:
+                    instances = UNCHANGED
+                elif response.status_code < 200 or response.status_code >= 300:
+                    print('Appliance ' + identity + ': ' + 'Bad response status code ' + str(response.status_code) + ' for instance metrics data')
                     continue
+                else:
+                    start = time.perf_counter()
+                    instances = parseInstanceMetrics(response.content, identities)
+                    stats.parsed(time.perf_counter() - start)
+                    self.cacheResponse(url, response, responses, identities)
 
-                status = data['status']  # string
-                MGMT_uptime = data['MGMT_uptime']  # string
-                pvCount = int(data['pvCount'])  # int
-                connectedPVCount = int(data['connectedPVCount'])  # int
-                disconnectedPVCount = int(data['disconnectedPVCount'])  # int
-                dataRateGBPerDay = float(data['dataRateGBPerDay'])  # float
-
-                # print(status)
-                # print(MGMT_uptime)
-                # print(pvCount)
-                # print(connectedPVCount)
-                # print(disconnectedPVCount)
-                # print(dataRateGBPerDay)
-
-                pv_identity = '' if number_of_nodes == 1 else appliance['identity']
-                pv_separator = '' if number_of_nodes == 1 else ':'
-                self.setParam(f'{pv_identity}{pv_separator}status', status)
-                self.setParam(f'{pv_identity}{pv_separator}MGMT_uptime', MGMT_uptime)
-                self.setParam(f'{pv_identity}{pv_separator}pvCount', pvCount)
-                self.setParam(f'{pv_identity}{pv_separator}connectedPVCount', connectedPVCount)
-                self.setParam(f'{pv_identity}{pv_separator}disconnectedPVCount', disconnectedPVCount)
-                self.setParam(f'{pv_identity}{pv_separator}dataRateGBPerDay', dataRateGBPerDay)
-
-                # do updates so clients see the changes
-                self.updatePVs()
+            # Unreachable, e.g. the host is down, which is probed like a refused connection
+            except ConnectTimeout:
+                print(f'Appliance {identity}: Connection for instance metrics data has timed out')
+                refusals += 1
+                continue
 
             except Timeout:
                 print(f'Appliance {identity}: Request for instance metrics data has timed out')
-                self.invalidateInstanceMetrics(appliance)
+                continue
 
             except ConnectionError:
                 print(f'Appliance {identity}: Connection for instance metrics data has been refused')
-                self.invalidateInstanceMetrics(appliance)
+                refusals += 1
+                continue
+
+            # Other errors of the request, e.g. the connection has been dropped while the response was received
+            except RequestException as e:
+                print(f'Appliance {identity}: Request for instance metrics data has failed: {e}')
+                continue
+
+            except ValueError:
+                print(f'Appliance {identity}: Instance metrics data is not valid JSON')
+                continue
+
+            if index != self.instanceMetricsSource:
+                print(f'Appliance {identity}: Instance metrics data is now fetched from {url}')
+                self.instanceMetricsSource = index
+
+            return identities, instances
+
+        stats.refused = refusals == len(nodes)
+        return None
 
-            # Delay 5 seconds
-            time.sleep(REQUEST_INTERVAL)
+    # Set instance metrics of all appliances from the instance metrics data of the cluster indexed by identity
+    # Appliances which have been added after the data has been fetched are set by the next poll
+    def applyInstanceMetrics(self, result):
+        if result is None:
+            print('Instance metrics data is not available from any appliance')
+            for appliance in self.appliances:
+                self.invalidateMetrics(appliance, 'instance')
+            return
 
-    # Polling thread for appliance metrics
-    def pollApplianceMetrics(self, appliance):
+        identities, instances = result
+        if instances is UNCHANGED:
+            return
+
+        identities = set(identities)
+        for appliance in self.appliances:
+            if not(appliance['identity'] in identities):
+                continue
+            data = instances.get(appliance['identity'])
+            if data is None:
+                print(f'Appliance {appliance["identity"]}: Instance data is not found')
+                self.invalidateMetrics(appliance, 'instance')
+                continue
+            self.updateMetrics(appliance, 'instance', { None: data })
+
+    # Get appliance metrics data of one appliance
+    def fetchApplianceMetrics(self, appliance):
         url = appliance["url"]
         identity = appliance["identity"]
-        GET_APPLIANCE_METRICS_FOR_APPLIANCE_URL = f'{url}/mgmt/bpl/getApplianceMetricsForAppliance?appliance={identity}'
+        stats = self.pollStats.get(('appliance', identity))
+        responses = self.responses.get(('appliance', identity))
+        urls = self.requestUrls.get(identity)
+        if stats is None or urls is None:
+            # The appliance has been removed
+            return None
+        stats.refused = False
 
-        while True:
-            try: 
-                # Get storage metrics data
-                response = requests.get(GET_APPLIANCE_METRICS_FOR_APPLIANCE_URL, timeout = REQUEST_TIMEOUT)
-
-                if response.status_code < 200 or response.status_code >= 300:
-                    print('Appliance ' + identity + ': ' + 'Bad response status code ' + str(response.status_code) + ' for appliance metrics data')
-                    self.invalidateApplianceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+        try: 
+            # Get appliance metrics data
+            response = self.conditionalGet(url, urls['appliance'], stats, responses)
 
-                text = response.text
+            if response is None:
+                return UNCHANGED
 
-                if not text:
-                    print('Appliance ' + identity + ': ' + 'response text for appliance metrics data is empty, maybe identity is not correct')
-                    self.invalidateApplianceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+            if response.status_code < 200 or response.status_code >= 300:
+                print('Appliance ' + identity + ': ' + 'Bad response status code ' + str(response.status_code) + ' for appliance metrics data')
+                return None
 
-                data = json.loads(text)
+            body = response.content
 
-                if len(data) == 0:
-                    print(f'Appliance {identity}: Empty text response for appliance metrics data')
-                    self.invalidateApplianceMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+            if not body:
+                print('Appliance ' + identity + ': ' + 'response text for appliance metrics data is empty, maybe identity is not correct')
+                return None
 
-                for item in data:
-                    if item['name'] == 'Paused PV count':
-                        pausedPVCount = int(item['value'])
+            start = time.perf_counter()
+            items = parseNamedItems(body, metric_items['appliance'])
+            stats.parsed(time.perf_counter() - start)
+            self.cacheResponse(url, response, responses)
 
-                # print(pausedPVCount)
+        # Unreachable, e.g. the host is down, which is probed like a refused connection
+        except ConnectTimeout:
+            print(f'Appliance {identity}: Connection for appliance metrics data has timed out')
+            stats.refused = True
+            return None
 
-                pv_identity = '' if number_of_nodes == 1 else appliance['identity']
-                pv_separator = '' if number_of_nodes == 1 else ':'   
-                self.setParam(f'{pv_identity}{pv_separator}pausedPVCount', pausedPVCount)
-            
-                # do updates so clients see the changes
-                self.updatePVs()
+        except Timeout:
+            print(f'Appliance {identity}: Request for appliance metrics data has timed out')
+            return None
 
-            except Timeout:
-                print(f'Appliance {identity}: Request for appliance metrics data has timed out')
-                self.invalidateApplianceMetrics(appliance)
-                
-            except ConnectionError:
-                print(f'Appliance {identity}: Connection for appliance metrics data has been refused')
-                self.invalidateApplianceMetrics(appliance)
+        except ConnectionError:
+            print(f'Appliance {identity}: Connection for appliance metrics data has been refused')
+            stats.refused = True
+            return None
+
+        # Other errors of the request, e.g. the connection has been dropped while the response was received
+        except RequestException as e:
+            print(f'Appliance {identity}: Request for appliance metrics data has failed: {e}')
+            return None
+
+        except ValueError:
+            print(f'Appliance {identity}: Appliance metrics data is not valid JSON')
+            return None
+
+        return items
+
+    # Set appliance metrics of one appliance
+    def applyApplianceMetrics(self, appliance, items):
+        # Late results of an appliance which has been removed are dropped
+        if not(appliance['identity'] in self.bindings):
+            return
+
+        if items is UNCHANGED:
+            return
 
-            # Delay 5 seconds
-            time.sleep(REQUEST_INTERVAL)
+        if items is None:
+            self.invalidateMetrics(appliance, 'appliance')
+            return
 
-    # Polling thread for storage metrics
-    def pollStorageMetrics(self, appliance):
+        self.updateMetrics(appliance, 'appliance', items)
+
+    # Get storage metrics data of one appliance
+    def fetchStorageMetrics(self, appliance):
         url = appliance["url"]
         identity = appliance["identity"]
-        GET_STORAGE_METRICS_FOR_APPLIANCE_URL = f'{url}/mgmt/bpl/getStorageMetricsForAppliance?appliance={identity}'
+        stats = self.pollStats.get(('storage', identity))
+        responses = self.responses.get(('storage', identity))
+        urls = self.requestUrls.get(identity)
+        if stats is None or urls is None:
+            # The appliance has been removed
+            return None
+        stats.refused = False
+
+        try: 
+            # Get storage metrics data
+            response = self.conditionalGet(url, urls['storage'], stats, responses)
+
+            if response is None:
+                return UNCHANGED
+
+            if response.status_code < 200 or response.status_code >= 300:
+                print('Appliance ' + identity + ': ' + 'Bad response status code ' + str(response.status_code) + ' for storage metrics data')
+                return None
+
+            body = response.content
+
+            if not body:
+                print('Appliance ' + identity + ': ' + 'response text for storage metrics data is empty, maybe identity is not correct')
+                return None
+
+            start = time.perf_counter()
+            items = parseNamedItems(body, metric_items['storage'])
+            stats.parsed(time.perf_counter() - start)
+            self.cacheResponse(url, response, responses)
+
+        # Unreachable, e.g. the host is down, which is probed like a refused connection
+        except ConnectTimeout:
+            print(f'Appliance {identity}: Connection for storage metrics data has timed out')
+            stats.refused = True
+            return None
+
+        except Timeout:
+            print(f'Appliance {identity}: Request for storage metrics data has timed out')
+            return None
+
+        except ConnectionError:
+            print(f'Appliance {identity}: Connection for storage metrics data has been refused')
+            stats.refused = True
+            return None
+
+        # Other errors of the request, e.g. the connection has been dropped while the response was received
+        except RequestException as e:
+            print(f'Appliance {identity}: Request for storage metrics data has failed: {e}')
+            return None
+
+        except ValueError:
+            print(f'Appliance {identity}: Storage metrics data is not valid JSON')
+            return None
 
+        return items
+
+    # Set storage metrics of one appliance
+    # The forecasts are still updated while the storage metrics data has not changed, since the time goes on
+    def applyStorageMetrics(self, appliance, items):
+        # Late results of an appliance which has been removed are dropped
+        if not(appliance['identity'] in self.bindings):
+            return
+
+        if items is UNCHANGED:
+            self.updateForecasts(appliance, self.storageItems.get(appliance['identity'], {}))
+            return
+
+        self.storageItems[appliance['identity']] = items or {}
+        if items is None:
+            self.invalidateMetrics(appliance, 'storage')
+            self.updateForecasts(appliance, {})
+            return
+
+        self.updateMetrics(appliance, 'storage', items)
+        self.updateForecasts(appliance, items)
+
+    # Add the available space of the storage tiers of one appliance to their forecasts, and set the forecast PVs
+    # The forecast PVs of a tier are invalid while its available space is not available, and until the samples span
+    # forecast_warmup hours, since the regression over a short span is dominated by the rounding of the available space to 0.01 GB
+    # The hours until full of an invalid forecast are FORECAST_MAX_HOURS, so that they neither alarm nor look like a full tier
+    def updateForecasts(self, appliance, items):
+        hours = time.time() / 3600
+        for tier, forecast, fillRate, hoursUntilFull in self.forecasts.get(appliance['identity'], ()):
+            try:
+                available = CONVERTERS['number'](items[tier]['available_space'])
+            except (KeyError, TypeError, ValueError):
+                self.stageParam(fillRate, 0, invalid = True)
+                self.stageParam(hoursUntilFull, FORECAST_MAX_HOURS, invalid = True)
+                continue
+            forecast.add(hours, available)
+            if forecast.span < forecast_warmup:
+                self.stageParam(fillRate, 0, invalid = True)
+                self.stageParam(hoursUntilFull, FORECAST_MAX_HOURS, invalid = True)
+                continue
+            self.stageParam(fillRate, forecast.fillRate())
+            self.stageParam(hoursUntilFull, forecast.hoursUntilFull(available))
+
+    # Log an error of a poller which is not expected, e.g. a bug, after which polling goes on
+    def pollerError(self, stats):
+        print(f'Poller {stats.name}: Unexpected error, polling goes on')
+        traceback.print_exc()
+
+    # Fetch the metrics data of one endpoint, an unexpected error counts as a failed poll so that the PVs are invalidated
+    def guardedFetch(self, fetch, stats, *args):
+        try:
+            return fetch(*args)
+        except Exception:
+            self.pollerError(stats)
+            return None
+
+    # Polling thread for one metrics endpoint
+    # After a poll has failed since no connection could be opened, refused or timed out, the urls are probed once per interval
+    # and polled again as soon as they accept connections
+    # After other failures, such as read timeouts of a hung appliance which still accepts connections, the backoff is kept
+    def pollEndpoint(self, fetch, apply, interval, urls, stats, stop, *args):
+        schedule = PollSchedule(interval)
+        if stop.wait(schedule.firstDelay()):
+            return
         while True:
-            try: 
-                # Get storage metrics data
-                response = requests.get(GET_STORAGE_METRICS_FOR_APPLIANCE_URL, timeout = REQUEST_TIMEOUT)
-
-                if response.status_code < 200 or response.status_code >= 300:
-                    print('Appliance ' + identity + ': ' + 'Bad response status code ' + str(response.status_code) + ' for storage metrics data')
-                    self.invalidateStorageMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+            values = self.guardedFetch(fetch, stats, *args)
+            if stop.is_set():
+                return
+            try:
+                apply(*args, values)
+                self.stageStats(stats, values is not None)
+            except Exception:
+                self.pollerError(stats)
+            delay = schedule.nextDelay(values is not None)
+            while values is None and stats.refused and delay > schedule.interval:
+                if stop.wait(schedule.interval):
+                    return
+                delay -= schedule.interval
+                if probe(urls):
+                    delay = 0
+                    break
+            if stop.wait(delay):
+                return
 
-                text = response.text
+    # Poll one endpoint and hand the results over to the main thread
+    # After a poll has failed since no connection could be opened, refused or timed out, the urls are probed once per interval
+    # and polled again as soon as they accept connections, after other failures the backoff is kept
+    async def pollAsyncTask(self, fetch, apply, interval, urls, stats, *args):
+        loop = asyncio.get_running_loop()
+        schedule = PollSchedule(interval)
+        await asyncio.sleep(schedule.firstDelay())
+        while True:
+            values = await loop.run_in_executor(None, self.guardedFetch, fetch, stats, *args)
+            try:
+                self.results.put((apply, args + (values,)))
+                self.stageStats(stats, values is not None)
+            except Exception:
+                self.pollerError(stats)
+            delay = schedule.nextDelay(values is not None)
+            while values is None and stats.refused and delay > schedule.interval:
+                await asyncio.sleep(schedule.interval)
+                delay -= schedule.interval
+                if await loop.run_in_executor(None, probe, urls):
+                    delay = 0
+                    break
+            await asyncio.sleep(delay)
 
-                if not text:
-                    print('Appliance ' + identity + ': ' + 'response text for storage metrics data is empty, maybe identity is not correct')
-                    self.invalidateStorageMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
-                    continue
+    # Stage a new value of a PV, which is published by the next call of publish
+    # The cluster aggregates of the PV are adjusted by the new value
+    def stageParam(self, reason, value, invalid = False):
+        with self.stagedLock:
+            self.staged[reason] = (value, invalid)
+            for aggregateReason, aggregate, identity in self.aggregateMembers.get(reason, ()):
+                aggregate.update(identity, value, invalid)
+                self.staged[aggregateReason] = (aggregate.value(), aggregate.isInvalid())
+
+    # Stage the statistics of an endpoint after a poll
+    def stageStats(self, stats, success):
+        stats.polled(success)
+        for reason, value in stats.values():
+            self.stageParam(reason, value)
+        if stats.name == 'poll:instance':
+            self.stageParam('poller:cyclePeriod', stats.period)
+
+    # Summary of the health of the monitored appliances, reported to the supervisor
+    def health(self):
+        failingNodes = 0
+        for appliance in self.appliances:
+            if any(self.pollStats[(endpoint, appliance['identity'])].failures for endpoint in ('appliance', 'storage')):
+                failingNodes += 1
+        return {
+            'nodes': len(self.appliances),
+            'failingNodes': failingNodes,
+            'instanceFailures': self.pollStats[('instance', None)].failures,
+            'pvs': len(pvdb),
+        }
+
+    # Record the CPU time spent in server.process by the main loop, staged once per second
+    # The wall time would mostly be the timeout of server.process waiting for CA requests, whereas the CPU time is the
+    # time spent serving CA clients, which approaches the timeout when the CA server is saturated
+    def recordProcessTime(self, seconds):
+        self.processTimes.append(seconds * 1000)
+        now = time.monotonic()
+        if now - self.processTimesStaged >= 1:
+            self.processTimesStaged = now
+            processTimes = self.processTimes.values()
+            self.stageParam('poller:processTime', sum(processTimes) / len(processTimes))
+            self.stageParam('poller:processTimeMax', max(processTimes))
+
+    # Sample the published values of the history metrics once per history interval, called from the main thread
+    def sampleHistory(self):
+        now = time.monotonic()
+        if now < self.historySample:
+            return
+        self.historySample += history_interval
+        if self.historySample < now:
+            self.historySample = now + history_interval
+
+        timestamp = time.time()
+        values = {}
+        for reason in self.historyReasons:
+            last = self.published.get(reason)
+            values[reason] = None if last is None or last[1] else last[0]
+        for resolution in self.history:
+            if resolution.add(timestamp, values):
+                self.stageParam(resolution.timesReason, resolution.times.values())
+                for reason, buffer in resolution.buffers.items():
+                    self.stageParam(resolution.waveforms[reason], buffer.values())
 
-                data = json.loads(text)
+    # Publish the staged values which differ from the published ones, called from the main thread
+    # Changes of numeric values within the deadband of a PV are not published
+    def publish(self):
+        with self.stagedLock:
+            if not self.staged:
+                return
+            staged = self.staged
+            self.staged = {}
 
-                if len(data) == 0:
-                    print(f'Appliance {identity}: Empty text response for storage metrics data')
-                    self.invalidateStorageMetrics(appliance)
-                    time.sleep(REQUEST_INTERVAL)
+        changed = []
+        for reason, (value, invalid) in staged.items():
+            if reason in self.retired:
+                continue
+            last = self.published.get(reason)
+            if last is not None and last[1] == invalid:
+                if last[0] == value:
                     continue
+                deadband = self.deadbands.get(reason)
+                if deadband is not None and abs(value - last[0]) <= deadband:
+                    continue
+            self.setParam(reason, value)
+            if invalid:
+                self.setParamStatus(reason, Alarm.COMM_ALARM, Severity.MINOR_ALARM)
+            self.published[reason] = (value, invalid)
+            changed.append(reason)
 
-                for item in data:
-                    if item['name'] == 'STS':
-                        sts_total_space = float(item['total_space'].replace(',', ''))
-                        sts_available_space = float(item['available_space'].replace(',', ''))
-                        sts_available_space_percent = float(item['available_space_percent'].replace(',', ''))
-                    if item['name'] == 'MTS':
-                        mts_total_space = float(item['total_space'].replace(',', ''))
-                        mts_available_space = float(item['available_space'].replace(',', ''))
-                        mts_available_space_percent = float(item['available_space_percent'].replace(',', ''))
-                    if item['name'] == 'LTS':
-                        lts_total_space = float(item['total_space'].replace(',', ''))
-                        lts_available_space = float(item['available_space'].replace(',', ''))
-                        lts_available_space_percent = float(item['available_space_percent'].replace(',', ''))
-
-                # print(sts_total_space)
-                # print(sts_available_space)
-                # print(sts_available_space_percent)
-                # print(mts_total_space)
-                # print(mts_available_space)
-                # print(mts_available_space_percent)
-                # print(lts_total_space)
-                # print(lts_available_space)
-                # print(lts_available_space_percent)
-                        
-                pv_identity = '' if number_of_nodes == 1 else appliance['identity']
-                pv_separator = '' if number_of_nodes == 1 else ':'
-                self.setParam(f'{pv_identity}{pv_separator}sts_total_space', sts_total_space)
-                self.setParam(f'{pv_identity}{pv_separator}sts_available_space', sts_available_space)
-                self.setParam(f'{pv_identity}{pv_separator}sts_available_space_percent', sts_available_space_percent)
-                self.setParam(f'{pv_identity}{pv_separator}mts_total_space', mts_total_space)
-                self.setParam(f'{pv_identity}{pv_separator}mts_available_space', mts_available_space)
-                self.setParam(f'{pv_identity}{pv_separator}mts_available_space_percent', mts_available_space_percent)
-                self.setParam(f'{pv_identity}{pv_separator}lts_total_space', lts_total_space)
-                self.setParam(f'{pv_identity}{pv_separator}lts_available_space', lts_available_space)
-                self.setParam(f'{pv_identity}{pv_separator}lts_available_space_percent', lts_available_space_percent)
-            
-                # do updates so clients see the changes
-                self.updatePVs()
+        # do updates so clients see the changes
+        for reason in changed:
+            self.updatePV(reason)
 
-            except Timeout:
-                print(f'Appliance {identity}: Request for storage metrics data has timed out')
-                self.invalidateStorageMetrics(appliance)
-                
-            except ConnectionError:
-                print(f'Appliance {identity}: Connection for storage metrics data has been refused')
-                self.invalidateStorageMetrics(appliance)
+        if self.export is not None and changed:
+            self.export.update([(reason, self.published[reason][0], self.pvDB[reason].alarm, self.pvDB[reason].severity)
+                                for reason in changed])
 
-            # Delay 5 seconds
-            time.sleep(REQUEST_INTERVAL)
+    # One iteration of the main loop: process CA transactions, then register appliances and publish the new values
+    def step(self, server):
+        start = time.thread_time()
+        server.process(0.1)
+        self.recordProcessTime(time.thread_time() - start)
+        self.registerAppliances()
+        self.processResults()
+        self.sampleHistory()
+        self.publish()
 
-if __name__ == '__main__':
+    # Set the results of the asyncio poller, called from the main thread
+    def processResults(self):
+        while True:
+            try:
+                apply, args = self.results.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                apply(*args)
+            except Exception:
+                print('Unexpected error while setting the results of the asyncio poller')
+                traceback.print_exc()
+
+# Serve the PVs of the configured appliances
+# report is called with the health summary of the driver every HEALTH_REPORT_INTERVAL seconds, if given
+def serve(report = None):
     server = SimpleServer()
     server.createPV(prefix, pvdb)
     driver = myDriver()
+    reported = time.monotonic()
 
     # process CA transactions
     while True:
-        server.process(0.1)
+        driver.step(server)
+        if report is not None and time.monotonic() - reported >= HEALTH_REPORT_INTERVAL:
+            reported = time.monotonic()
+            report(driver.health())
+
+# Monitor one of CLUSTERS in a worker process of the supervisor
+# The settings of the cluster override the ones of customized_config.py, and the health is reported through a queue
+def runWorker(cluster, health):
+    global cluster_name
+    settings = dict(cluster)
+    name = settings.pop('name')
+    globals().update(settings)
+    cluster_name = name
+    configure()
+    serve(lambda summary: health.put((name, os.getpid(), summary)))
+
+# Worker process of the supervisor which monitors one cluster
+class Worker:
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.name = cluster['name']
+        self.process = None
+        self.restarts = 0
+        self.started = 0.0
+        self.reported = None  # time of the last health report
+        self.summary = None  # last health report
+        self.restartAt = None  # time at which the worker is restarted after a failure
+        self.state = 'starting'
+
+    def start(self, health):
+        self.process = multiprocessing.Process(target = runWorker, args = (self.cluster, health), name = self.name)
+        self.process.daemon = True
+        self.process.start()
+        self.started = time.monotonic()
+        self.reported = None
+        self.restartAt = None
+        self.state = 'starting'
+
+    # Check the process of the worker, restarting it if it has failed or hangs
+    def check(self, health):
+        now = time.monotonic()
+        if self.restartAt is not None:
+            if now >= self.restartAt:
+                self.restarts += 1
+                print(f'Cluster {self.name}: Restarting worker, restart {self.restarts}')
+                self.start(health)
+            return
+
+        if self.state == 'stopped':
+            return
+
+        if not self.process.is_alive():
+            if self.process.exitcode == 0:
+                # Exits without error only if the configuration of the cluster is not valid, which a restart does not fix
+                print(f'Cluster {self.name}: Worker has exited, check the configuration of the cluster')
+                self.state = 'stopped'
+                return
+            print(f'Cluster {self.name}: Worker has failed with exit code {self.process.exitcode}')
+            self.state = 'failed'
+            self.restartAt = now + RESTART_DELAY
+            return
+
+        if now - (self.reported if self.reported is not None else self.started) > WORKER_TIMEOUT:
+            print(f'Cluster {self.name}: Worker has not reported for {WORKER_TIMEOUT} seconds, terminating it')
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+            self.state = 'hung'
+            self.restartAt = now + RESTART_DELAY
+
+    def report(self, pid, summary):
+        # Drop late reports of a process which has been replaced
+        if self.process is None or pid != self.process.pid:
+            return
+        self.reported = time.monotonic()
+        self.summary = summary
+        self.state = 'running'
+
+    # One line of the health summary
+    def describe(self):
+        line = f'{self.name}: {self.state}, {self.restarts} restarts'
+        if self.summary is not None and self.state == 'running':
+            summary = self.summary
+            instance = 'failing' if summary['instanceFailures'] else 'ok'
+            line += (f', {summary["nodes"]} nodes, {summary["failingNodes"]} failing, instance metrics {instance}, '
+                     f'{summary["pvs"]} PVs, reported {time.monotonic() - self.reported:.0f} seconds ago')
+        return line
+
+# Check CLUSTERS and return the settings of every cluster which are not set by customized_config.py, exits if it is not valid
+def checkClusters():
+    names = [cluster.get('name') for cluster in CLUSTERS]
+    if None in names or len(set(names)) != len(names):
+        print('Error: every cluster in CLUSTERS should have a unique name, exiting ...')
+        exit()
+
+    required = ('appliances', 'prefix', 'REQUEST_TIMEOUT', 'REQUEST_INTERVAL')
+    prefixes = []
+    for cluster in CLUSTERS:
+        for key in cluster:
+            if key != 'name' and not(key in required) and not(key.isupper() and key in globals() and key != 'CLUSTERS'):
+                print(f'Error: {key} of cluster {cluster["name"]} is not a setting, exiting ...')
+                exit()
+        for key in required:
+            if not(key in cluster) and not(key in globals()):
+                print(f'Error: cluster {cluster["name"]} has no {key}, exiting ...')
+                exit()
+        prefixes.append(cluster.get('prefix', globals().get('prefix')))
+    if len(set(prefixes)) != len(prefixes):
+        print('Error: every cluster in CLUSTERS should have its own prefix, exiting ...')
+        exit()
+    ports = [cluster.get('EXPORT_PORT', EXPORT_PORT) for cluster in CLUSTERS]
+    ports = [port for port in ports if port is not None]
+    if len(set(ports)) != len(ports):
+        print('Error: every cluster in CLUSTERS should have its own EXPORT_PORT, exiting ...')
+        exit()
+
+# Run one worker process for each of CLUSTERS, restart the workers which fail, and print the health of all clusters
+def supervise():
+    checkClusters()
+    print('\n')
+    print(f'*** Supervising {len(CLUSTERS)} clusters, each in its own worker process ***')
+    print('\n')
+
+    health = multiprocessing.Queue()
+    workers = {}
+    for cluster in CLUSTERS:
+        workers[cluster['name']] = Worker(cluster)
+        workers[cluster['name']].start(health)
+
+    summarized = time.monotonic()
+    while True:
+        try:
+            name, pid, summary = health.get(timeout = 1)
+            workers[name].report(pid, summary)
+        except queue.Empty:
+            pass
+
+        for worker in workers.values():
+            worker.check(health)
+
+        if time.monotonic() - summarized >= HEALTH_INTERVAL:
+            summarized = time.monotonic()
+            running = [worker for worker in workers.values() if worker.state == 'running']
+            nodes = sum(worker.summary['nodes'] for worker in running)
+            failing = sum(worker.summary['failingNodes'] for worker in running)
+            print('\n')
+            print(f'*** Health at {time.strftime("%Y-%m-%d %H:%M:%S")}: {len(running)} of {len(workers)} clusters running, '
+                  f'{failing} of {nodes} nodes failing ***')
+            for worker in workers.values():
+                print(worker.describe())
+            print('\n')
+
+if __name__ == '__main__':
+    if CLUSTERS:
+        supervise()
+    else:
+        configure()
+        serve()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# Stand-in for the mgmt BPL of an Archiver Appliance cluster, for testing and benchmarking archiver_status.py offline
+#
+# Every node of the fake cluster listens on its own port, starting from --base-port, and serves
+#   /mgmt/bpl/getInstanceMetrics
+#   /mgmt/bpl/getApplianceMetricsForAppliance?appliance=<identity>
+#   /mgmt/bpl/getStorageMetricsForAppliance?appliance=<identity>
+# and /stats with the number of requests served, as JSON.
+#
+# Usage: python benchmarks/fake_bpl_server.py --nodes 50 --latency 0.05 --error-rate 0.01
+# A matching appliances list for customized_config.py is printed with --print-config.
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Metrics of one fake appliance, which drift a little on every request like the ones of a real appliance
+class FakeAppliance:
+    def __init__(self, identity, pvCount):
+        self.identity = identity
+        self.pvCount = pvCount
+        self.disconnectedPVCount = random.randint(0, pvCount // 100)
+        self.pausedPVCount = random.randint(0, 10)
+        self.dataRateGBPerDay = random.uniform(5, 50)
+        self.started = time.time()
+        self.stores = {}
+        for name, total in (('STS', 64), ('MTS', 2048), ('LTS', 102400)):
+            self.stores[name] = [total, total * random.uniform(0.3, 0.9)]
+        self.lock = threading.Lock()
+
+    def drift(self):
+        with self.lock:
+            self.dataRateGBPerDay = max(0, self.dataRateGBPerDay + random.gauss(0, 0.05))
+            for store in self.stores.values():
+                store[1] = min(store[0], max(0, store[1] - random.uniform(0, store[0] * 1e-6)))
+
+    def instanceMetrics(self):
+        uptime = int(time.time() - self.started)
+        return {
+            'instance': self.identity,
+            'status': 'Working',
+            'MGMT_uptime': f'{uptime // 86400} days {uptime // 3600 % 24} hours {uptime // 60 % 60} minutes and {uptime % 60} seconds',
+            'pvCount': str(self.pvCount),
+            'connectedPVCount': str(self.pvCount - self.disconnectedPVCount),
+            'disconnectedPVCount': str(self.disconnectedPVCount),
+            'dataRateGBPerDay': f'{self.dataRateGBPerDay:.2f}',
+            'dataRate': f'{self.dataRateGBPerDay * 1e9 / 86400:,.2f}',
+            'eventRate': f'{self.pvCount * 1.3:,.2f}',
+            'formattedWriteThreadSeconds': '0.35',
+            'maxETLPercentage': '3',
+            'timeForOverallPVCountCheck': '12',
+        }
+
+    def applianceMetrics(self, payloadItems):
+        items = [{'name': 'Appliance identity', 'value': self.identity}]
+        items += [{'name': f'Fake metric {i}', 'value': f'{i * 1000:,}'} for i in range(payloadItems)]
+        items.insert(len(items) // 2, {'name': 'Paused PV count', 'value': str(self.pausedPVCount)})
+        return items
+
+    def storageMetrics(self):
+        return [{
+            'name': name,
+            'id': name.lower(),
+            'total_space': f'{total:,.2f}',
+            'available_space': f'{available:,.2f}',
+            'available_space_percent': f'{available * 100 / total:.2f}',
+        } for name, (total, available) in self.stores.items()]
+
+# Fake cluster of appliances, each served on its own port
+class FakeCluster:
+    def __init__(self, nodes, host = '127.0.0.1', basePort = 17665, identityFormat = 'appliance_{:02d}', pvCount = 25000,
+                 latency = 0.0, latencyJitter = 0.0, errorRate = 0.0, timeoutRate = 0.0, hang = 30.0, payloadItems = 50):
+        self.host = host
+        self.basePort = basePort
+        self.appliances = [FakeAppliance(identityFormat.format(i), pvCount) for i in range(nodes)]
+        self.byIdentity = {appliance.identity: appliance for appliance in self.appliances}
+        self.latency = latency
+        self.latencyJitter = latencyJitter
+        self.errorRate = errorRate
+        self.timeoutRate = timeoutRate
+        self.hang = hang
+        self.payloadItems = payloadItems
+        self.stats = {'getInstanceMetrics': 0, 'getApplianceMetricsForAppliance': 0, 'getStorageMetricsForAppliance': 0,
+                      'errors': 0, 'timeouts': 0, 'bytes': 0}
+        self.statsLock = threading.Lock()
+        self.servers = []
+
+    def count(self, key, amount = 1):
+        with self.statsLock:
+            self.stats[key] += amount
+
+    # appliances list for customized_config.py
+    def config(self):
+        return [{'url': f'http://{self.host}:{self.basePort + i}', 'identity': appliance.identity}
+                for i, appliance in enumerate(self.appliances)]
+
+    def start(self):
+        cluster = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                parts = urllib.parse.urlsplit(self.path)
+                endpoint = parts.path.rsplit('/', 1)[-1]
+                query = urllib.parse.parse_qs(parts.query)
+
+                if parts.path == '/stats':
+                    with cluster.statsLock:
+                        stats = dict(cluster.stats)
+                    return self.reply(200, stats)
+
+                if not(endpoint in cluster.stats) or not parts.path.startswith('/mgmt/bpl/'):
+                    return self.reply(404, {'error': f'Unknown path {parts.path}'})
+                cluster.count(endpoint)
+
+                if cluster.latency or cluster.latencyJitter:
+                    time.sleep(max(0, random.gauss(cluster.latency, cluster.latencyJitter)))
+                if random.random() < cluster.timeoutRate:
+                    cluster.count('timeouts')
+                    time.sleep(cluster.hang)
+                if random.random() < cluster.errorRate:
+                    cluster.count('errors')
+                    return self.reply(500, {'error': 'Fake error'})
+
+                if endpoint == 'getInstanceMetrics':
+                    return self.reply(200, [appliance.instanceMetrics() for appliance in cluster.appliances])
+
+                appliance = cluster.byIdentity.get(query.get('appliance', [''])[0])
+                if appliance is None:
+                    # Archiver Appliance answers an unknown identity with an empty body
+                    return self.reply(200, None)
+                appliance.drift()
+                if endpoint == 'getApplianceMetricsForAppliance':
+                    return self.reply(200, appliance.applianceMetrics(cluster.payloadItems))
+                return self.reply(200, appliance.storageMetrics())
+
+            def reply(self, status, data):
+                body = b'' if data is None else json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if body and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body, compresslevel = 1)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                cluster.count('bytes', len(body))
+
+        for i in range(len(self.appliances)):
+            server = ThreadingHTTPServer((self.host, self.basePort + i), Handler)
+            server.daemon_threads = True
+            thread = threading.Thread(target = server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            self.servers.append(server)
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Stand-in for the mgmt BPL of an Archiver Appliance cluster')
+    parser.add_argument('--nodes', type = int, default = 2, help = 'number of appliances in the cluster')
+    parser.add_argument('--host', default = '127.0.0.1', help = 'address to listen on')
+    parser.add_argument('--base-port', type = int, default = 17665, help = 'port of the first appliance, the others follow')
+    parser.add_argument('--identity-format', default = 'appliance_{:02d}', help = 'format of the appliance identities')
+    parser.add_argument('--pv-count', type = int, default = 25000, help = 'number of PVs archived by every appliance')
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'mean seconds before every response')
+    parser.add_argument('--latency-jitter', type = float, default = 0.0, help = 'standard deviation of the latency')
+    parser.add_argument('--error-rate', type = float, default = 0.0, help = 'fraction of requests answered with HTTP 500')
+    parser.add_argument('--timeout-rate', type = float, default = 0.0, help = 'fraction of requests which hang for --hang seconds')
+    parser.add_argument('--hang', type = float, default = 30.0, help = 'seconds a hanging request waits before it is answered')
+    parser.add_argument('--payload-items', type = int, default = 50, help = 'extra items in appliance metrics, to set the payload size')
+    parser.add_argument('--print-config', action = 'store_true', help = 'print the appliances list for customized_config.py')
+    args = parser.parse_args()
+
+    cluster = FakeCluster(args.nodes, args.host, args.base_port, args.identity_format, args.pv_count, args.latency,
+                          args.latency_jitter, args.error_rate, args.timeout_rate, args.hang, args.payload_items)
+    cluster.start()
+    if args.print_config:
+        print('appliances = [')
+        for appliance in cluster.config():
+            print(f'    {appliance},')
+        print(']', flush = True)
+    print(f'Fake cluster of {args.nodes} appliances listening on {args.host}:{args.base_port}-{args.base_port + args.nodes - 1}', flush = True)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        cluster.stop()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# Micro-benchmark of BPL response parsing: json.loads of the decoded text (previous path) against bpl_parser
+#
+# Usage: python benchmarks/parse_benchmark.py [--nodes N] [--instance FILE] [--appliance FILE] [--storage FILE]
+# Recorded responses can be saved with e.g. curl http://localhost:17665/mgmt/bpl/getInstanceMetrics > instance.json
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bpl_parser
+
+# Responses similar to the ones of an Archiver Appliance cluster, used when no recorded responses are given
+def makeInstanceMetrics(nodes):
+    return json.dumps([{
+        'instance': f'appliance_{i:02d}',
+        'status': 'Working',
+        'MGMT_uptime': '12 days 3 hours 4 minutes and 5 seconds',
+        'pvCount': '25000',
+        'connectedPVCount': '24990',
+        'disconnectedPVCount': '10',
+        'dataRateGBPerDay': '12.34',
+        'dataRate': '142,823.50',
+        'eventRate': '5,021.20',
+        'formattedWriteThreadSeconds': '0.35',
+        'maxETLPercentage': '3',
+        'timeForOverallPVCountCheck': '12',
+    } for i in range(nodes)]).encode()
+
+def makeApplianceMetrics():
+    items = [{'name': f'Metric number {i}', 'value': f'{i * 1000:,}'} for i in range(60)]
+    items.insert(30, {'name': 'Paused PV count', 'value': '12'})
+    return json.dumps(items).encode()
+
+def makeStorageMetrics():
+    return json.dumps([{
+        'name': name,
+        'id': name.lower(),
+        'total_space': '1,024,000.00',
+        'available_space': '512,000.00',
+        'available_space_percent': '50.00',
+    } for name in ('STS', 'MTS', 'LTS')]).encode()
+
+# Previous parsing path of archiver_status.py: decode the whole body, then build the whole object graph
+def oldInstance(body, identities):
+    data = json.loads(body.decode())
+    instances = {}
+    for item in data:
+        if 'instance' in item and item['instance'] in identities:
+            instances[item['instance']] = item
+    return instances
+
+def oldNamedItems(body, names):
+    data = json.loads(body.decode())
+    return {item['name']: item for item in data if item['name'] in names}
+
+def run(label, old, new, number):
+    assert old() == new(), f'{label}: results differ'
+    oldTime = min(timeit.repeat(old, number = number, repeat = 5)) / number
+    newTime = min(timeit.repeat(new, number = number, repeat = 5)) / number
+    print(f'{label:<20} {oldTime * 1e6:>10.1f} us {newTime * 1e6:>10.1f} us {oldTime / newTime:>8.1f}x')
+
+def readFile(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Micro-benchmark of BPL response parsing')
+    parser.add_argument('--nodes', type = int, default = 50, help = 'number of appliances in generated instance metrics')
+    parser.add_argument('--instance', help = 'recorded getInstanceMetrics response')
+    parser.add_argument('--appliance', help = 'recorded getApplianceMetricsForAppliance response')
+    parser.add_argument('--storage', help = 'recorded getStorageMetricsForAppliance response')
+    parser.add_argument('--number', type = int, default = 1000, help = 'number of parses per measurement')
+    args = parser.parse_args()
+
+    instanceBody = readFile(args.instance) if args.instance else makeInstanceMetrics(args.nodes)
+    applianceBody = readFile(args.appliance) if args.appliance else makeApplianceMetrics()
+    storageBody = readFile(args.storage) if args.storage else makeStorageMetrics()
+    identities = [item['instance'] for item in json.loads(instanceBody)]
+    applianceNames = ['Paused PV count']
+    storageNames = ['STS', 'MTS', 'LTS']
+
+    print(f'JSON backend: {bpl_parser.json_backend}')
+    print(f'{"response":<20} {"previous":>13} {"bpl_parser":>13} {"speedup":>9}')
+    run(f'instance ({len(identities)} nodes)',
+        lambda: oldInstance(instanceBody, identities),
+        lambda: bpl_parser.parseInstanceMetrics(instanceBody, identities), args.number)
+    run('instance (1 node)',
+        lambda: oldInstance(instanceBody, identities[:1]),
+        lambda: bpl_parser.parseInstanceMetrics(instanceBody, identities[:1]), args.number)
+    run('appliance',
+        lambda: oldNamedItems(applianceBody, applianceNames),
+        lambda: bpl_parser.parseNamedItems(applianceBody, applianceNames), args.number)
+    run('storage',
+        lambda: oldNamedItems(storageBody, storageNames),
+        lambda: bpl_parser.parseNamedItems(storageBody, storageNames), args.number)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# Load benchmark of archiver_status.py against the fake BPL server
+#
+# The fake cluster runs in a separate process, and the driver with its pcaspy server runs in this process, so the
+# CPU time, threads and memory reported are the ones of the driver.
+#
+# Usage: python benchmarks/poller_benchmark.py --nodes 100 --duration 60 --mode asyncio --json result.json
+#        python benchmarks/poller_benchmark.py --nodes 100 --duration 60 --mode asyncio --baseline result.json
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+benchmarks = os.path.dirname(os.path.abspath(__file__))
+package = os.path.dirname(benchmarks)
+
+# Results where a higher value is a regression, compared against the baseline
+REGRESSION_KEYS = ['cpu_percent_per_appliance', 'fetch_latency_p99_ms', 'loop_iteration_max_ms', 'rss_mb', 'threads']
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def rssMegabytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak RSS in kB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def fakeStats(url):
+    with urllib.request.urlopen(f'{url}/stats', timeout = 5) as response:
+        return json.loads(response.read())
+
+def startFakeCluster(args):
+    command = [sys.executable, os.path.join(benchmarks, 'fake_bpl_server.py'), '--nodes', str(args.nodes),
+               '--base-port', str(args.base_port), '--latency', str(args.latency), '--latency-jitter', str(args.latency_jitter),
+               '--error-rate', str(args.error_rate), '--timeout-rate', str(args.timeout_rate), '--hang', str(args.timeout * 2),
+               '--payload-items', str(args.payload_items), '--print-config']
+    process = subprocess.Popen(command, stdout = subprocess.PIPE, text = True)
+    lines = []
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError('Fake BPL server has exited')
+        if line.startswith('Fake cluster'):
+            return process, ''.join(lines)
+        lines.append(line)
+
+def writeConfig(directory, appliances, args):
+    with open(os.path.join(directory, 'customized_config.py'), 'w') as f:
+        f.write(appliances)
+        f.write(f'REQUEST_TIMEOUT = {args.timeout}\n')
+        f.write(f'REQUEST_INTERVAL = {args.interval}\n')
+        f.write(f"prefix = '{args.prefix}'\n")
+        f.write(f"POLLING_MODE = '{args.mode}'\n")
+        f.write(f'ASYNC_CONCURRENCY = {args.concurrency}\n')
+
+def run(args):
+    fake, appliances = startFakeCluster(args)
+    fakeUrl = f'http://127.0.0.1:{args.base_port}'
+    directory = tempfile.mkdtemp(prefix = 'archiver_status_benchmark_')
+    writeConfig(directory, appliances, args)
+    sys.path[:0] = [directory, package]
+
+    # The messages of archiver_status.py are discarded, also the ones printed by its threads after the measurement
+    if not args.verbose:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        return measure(args, fakeUrl)
+    finally:
+        fake.terminate()
+        fake.wait()
+
+def measure(args, fakeUrl):
+    import archiver_status
+    from pcaspy import SimpleServer
+
+    archiver_status.configure()
+
+    latencies = []
+    counters = {'fetches': 0, 'failures': 0, 'pv_updates': 0}
+    measuring = threading.Event()
+
+    # Driver which records the latency of every fetch and counts the PV updates
+    class BenchmarkDriver(archiver_status.myDriver):
+        def timed(self, fetch, *args):
+            start = time.perf_counter()
+            result = fetch(*args)
+            if measuring.is_set():
+                latencies.append(time.perf_counter() - start)
+                counters['fetches'] += 1
+                counters['failures'] += result is None
+            return result
+
+        def fetchInstanceMetrics(self):
+            return self.timed(super().fetchInstanceMetrics)
+
+        def fetchApplianceMetrics(self, appliance):
+            return self.timed(super().fetchApplianceMetrics, appliance)
+
+        def fetchStorageMetrics(self, appliance):
+            return self.timed(super().fetchStorageMetrics, appliance)
+
+        def updatePV(self, reason):
+            if measuring.is_set():
+                counters['pv_updates'] += 1
+            super().updatePV(reason)
+
+    server = SimpleServer()
+    server.createPV(archiver_status.prefix, archiver_status.pvdb)
+    driver = BenchmarkDriver()
+
+    # Main loop of archiver_status.py, timing every iteration
+    def loop(seconds, iterations):
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            driver.step(server)
+            iterations.append(time.perf_counter() - start)
+
+    loop(args.warmup, [])
+
+    iterations = []
+    threads = threading.active_count()
+    statsBefore = fakeStats(fakeUrl)
+    cpuBefore = time.process_time()
+    start = time.monotonic()
+    measuring.set()
+    loop(args.duration, iterations)
+    measuring.clear()
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - cpuBefore
+    statsAfter = fakeStats(fakeUrl)
+    threads = max(threads, threading.active_count())
+
+    requests = sum(statsAfter[key] - statsBefore[key] for key in
+                   ('getInstanceMetrics', 'getApplianceMetricsForAppliance', 'getStorageMetricsForAppliance'))
+    return {
+        'nodes': args.nodes,
+        'mode': args.mode,
+        'interval': args.interval,
+        'duration': round(elapsed, 1),
+        'requests_per_second': round(requests / elapsed, 1),
+        'bytes_per_second': round((statsAfter['bytes'] - statsBefore['bytes']) / elapsed),
+        'fetches': counters['fetches'],
+        'failed_fetches': counters['failures'],
+        'fetch_latency_p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'fetch_latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'loop_iteration_mean_ms': round(sum(iterations) / max(1, len(iterations)) * 1000, 2),
+        'loop_iteration_max_ms': round(max(iterations, default = 0) * 1000, 2),
+        'pv_updates_per_second': round(counters['pv_updates'] / elapsed, 1),
+        'cpu_percent': round(cpu / elapsed * 100, 2),
+        'cpu_percent_per_appliance': round(cpu / elapsed * 100 / args.nodes, 3),
+        'threads': threads,
+        'rss_mb': round(rssMegabytes(), 1),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Load benchmark of archiver_status.py against the fake BPL server')
+    parser.add_argument('--nodes', type = int, default = 50, help = 'number of appliances in the fake cluster')
+    parser.add_argument('--mode', choices = ['thread', 'asyncio'], default = 'thread', help = 'POLLING_MODE of the driver')
+    parser.add_argument('--concurrency', type = int, default = 10, help = 'ASYNC_CONCURRENCY of the driver')
+    parser.add_argument('--interval', type = float, default = 2, help = 'REQUEST_INTERVAL of the driver')
+    parser.add_argument('--timeout', type = float, default = 2, help = 'REQUEST_TIMEOUT of the driver')
+    parser.add_argument('--duration', type = float, default = 30, help = 'seconds of measurement')
+    parser.add_argument('--warmup', type = float, default = 5, help = 'seconds before the measurement starts')
+    parser.add_argument('--base-port', type = int, default = 27665, help = 'port of the first fake appliance')
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'mean seconds before every fake response')
+    parser.add_argument('--latency-jitter', type = float, default = 0.0, help = 'standard deviation of the latency')
+    parser.add_argument('--error-rate', type = float, default = 0.0, help = 'fraction of requests answered with HTTP 500')
+    parser.add_argument('--timeout-rate', type = float, default = 0.0, help = 'fraction of requests which time out')
+    parser.add_argument('--payload-items', type = int, default = 50, help = 'extra items in appliance metrics responses')
+    parser.add_argument('--prefix', default = 'BENCH:', help = 'PV prefix of the driver')
+    parser.add_argument('--json', help = 'write the results to this file')
+    parser.add_argument('--baseline', help = 'compare the results with the results in this file')
+    parser.add_argument('--tolerance', type = float, default = 0.2, help = 'allowed fraction by which a result may exceed the baseline')
+    parser.add_argument('--verbose', action = 'store_true', help = 'show the output of archiver_status.py')
+    args = parser.parse_args()
+
+    results = run(args)
+    # The threads of archiver_status.py keep running until exit, so their output stays discarded
+    out = sys.__stdout__
+    for key, value in results.items():
+        print(f'{key:<28} {value}', file = out)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = [key for key in REGRESSION_KEYS
+                       if key in baseline and results[key] > baseline[key] * (1 + args.tolerance)]
+        for key in regressions:
+            print(f'Regression: {key} is {results[key]}, baseline is {baseline[key]}', file = out)
+        if regressions:
+            sys.exit(1)
+        print('No regression against the baseline', file = out)
@@ -0,0 +1,77 @@
+# Parsing of Archiver Appliance BPL JSON responses
+#
+# The responses are parsed from the raw bytes of the HTTP body, so the body is never decoded into a str.
+# Only the items which are published as PVs are picked out of the response, and the search stops as soon
+# as all of them are found.
+import json
+
+# Use a faster JSON backend when it is installed
+try:
+    import orjson
+    loads = orjson.loads
+    json_backend = 'orjson'
+except ImportError:
+    loads = json.loads
+    json_backend = 'json'
+
+# Bodies smaller than this are parsed as a whole, which is faster than scanning them
+SCAN_MIN_SIZE = 2048
+
+# Find the JSON objects whose key is one of the values, by parsing only the objects around the values
+# The items in BPL responses are flat objects, so each one lies between the nearest braces around the value
+def scanItems(body, key, values):
+    found = {}
+    for value in values:
+        needle = json.dumps(value).encode()
+        start = 0
+        while True:
+            pos = body.find(needle, start)
+            if pos < 0:
+                break
+            begin = body.rfind(b'{', 0, pos)
+            end = body.find(b'}', pos)
+            if begin < 0 or end < 0:
+                break
+            try:
+                item = loads(body[begin:end + 1])
+            except ValueError:
+                item = None
+            if isinstance(item, dict) and item.get(key) == value:
+                found[value] = item
+                break
+            start = pos + 1
+    return found
+
+# Find the items of a JSON list whose key is one of the values, returned as a dict by value
+# Falls back to parsing the whole body if some values are not found by the scan, raises ValueError for invalid JSON
+def findItems(body, key, values):
+    found = scanItems(body, key, values) if len(body) >= SCAN_MIN_SIZE else {}
+    if len(found) == len(values):
+        return found
+
+    data = loads(body)
+    if not isinstance(data, list):
+        raise ValueError('BPL response is not a JSON list')
+    for item in data:
+        if isinstance(item, dict) and item.get(key) in values and not(item[key] in found):
+            found[item[key]] = item
+    return found
+
+# Index the instance metrics of the identities by identity
+# All appliances of a cluster are needed in one response, so the whole body is parsed with the fast backend
+def parseInstanceMetrics(body, identities):
+    if len(identities) == 1:
+        return findItems(body, 'instance', identities)
+
+    data = loads(body)
+    if not isinstance(data, list):
+        raise ValueError('BPL response is not a JSON list')
+    instances = {}
+    for item in data:
+        if isinstance(item, dict) and 'instance' in item:
+            instances[item['instance']] = item
+    return instances
+
+# Get the items of appliance or storage metrics with the names, e.g. 'Paused PV count' or 'LTS'
+def parseNamedItems(body, names):
+    return findItems(body, 'name', names)
@@ -9,3 +9,78 @@ appliances = [
 REQUEST_TIMEOUT = 10
 REQUEST_INTERVAL = 10
 prefix = 'arcapp-acc:'
+
+# Optional: reloading of appliances when this file changes, startup registration and printing of PV names
+# CONFIG_CHECK_INTERVAL = 2
+# REGISTER_BATCH_SIZE = 10
+# PRINT_PVS = False
+
+# Optional: monitor several clusters from one host, each by its own worker process
+# Every cluster needs a unique name, its own prefix and appliances, and may override any other setting
+# CLUSTERS = [
+#     { 'name': 'dev',  'prefix': 'arcapp-dev:',  'appliances': [ { 'url': 'http://10.1.236.100:17665', 'identity': 'appliance0' } ] },
+#     { 'name': 'prod', 'prefix': 'arcapp-prod:', 'appliances': [ { 'url': 'http://10.1.236.142:17665', 'identity': 'appliance_01' },
+#                                                                 { 'url': 'http://10.1.236.143:17665', 'identity': 'appliance_02' } ],
+#       'POLLING_MODE': 'asyncio' },
+# ]
+# HEALTH_INTERVAL = 60
+# HEALTH_REPORT_INTERVAL = 5
+# WORKER_TIMEOUT = 60
+# RESTART_DELAY = 5
+
+# Optional: poll all appliances on one asyncio event loop instead of polling threads per appliance
+# POLLING_MODE = 'asyncio'
+# ASYNC_CONCURRENCY = 10
+
+# Optional: HTTP connection pooling and timeouts
+# HTTP_POOL_SIZE = 4
+# HTTP_KEEP_ALIVE = True
+# HTTP_GZIP = True
+# CONNECT_TIMEOUT = 3
+# READ_TIMEOUT = 10
+
+# Optional: skip parsing and publishing of BPL responses which have not changed since the last poll
+# RESPONSE_CACHE = True
+
+# Optional: export of all PVs over HTTP, in Prometheus text format on /metrics and as JSON on /json
+# EXPORT_PORT = 9665
+# EXPORT_ADDRESS = '127.0.0.1'
+
+# Optional: changes of these PVs smaller than or equal to the deadband are not published
+# PUBLISH_DEADBANDS = { 'dataRateGBPerDay': 0.015, 'lts_available_space': 0.105 }
+
+# Optional: polling schedule of each endpoint and backoff for appliances which do not answer
+# INSTANCE_METRICS_INTERVAL = 10
+# APPLIANCE_METRICS_INTERVAL = 30
+# STORAGE_METRICS_INTERVAL = 300
+# POLL_JITTER = 0.1
+# BACKOFF_MAX_INTERVAL = 300
+# PROBE_TIMEOUT = 1
+
+# Optional: number of latest polls of every endpoint kept for the latency percentile PVs
+# POLL_STATS_SIZE = 100
+
+# Optional: storage tiers whose fill rate is forecast, with the alarm limits of their hours until full
+# FORECAST_TIERS = {
+#     'STS': { 'low': 6,   'lolo': 1 },
+#     'MTS': { 'low': 72,  'lolo': 24 },
+#     'LTS': { 'low': 720, 'lolo': 168 },
+# }
+# FORECAST_TIME_CONSTANT = 6
+# FORECAST_MAX_HOURS = 87600
+# FORECAST_WARMUP = 3
+
+# Optional: metrics whose history is published as waveform PVs, sample interval and resolutions of the history
+# HISTORY_METRICS = ['dataRateGBPerDay', 'connectedPVCount', 'lts_available_space']
+# HISTORY_INTERVAL = 10
+# HISTORY_RESOLUTIONS = [
+#     { 'name': 'raw',   'period': 0,   'size': 360 },
+#     { 'name': '1min',  'period': 60,  'size': 240 },
+#     { 'name': '10min', 'period': 600, 'size': 144 },
+# ]
+
+# Optional: more metrics published as PVs, in the same format as METRICS in archiver_status.py
+# EXTRA_METRICS = [
+#     { 'endpoint': 'appliance', 'item': 'Total event rate (evts/s)', 'field': 'value', 'pv': 'eventRate',
+#       'convert': 'number', 'invalid': 0, 'type': 'float', 'prec': 2, 'unit': 'evts/s' },
+# ]